@@ -8,6 +8,7 @@ from inference_engine import IENetwork, IEPlugin
 import os
 import logging
 import cv2
+import numpy
 import platform
 from algo_result import IoTxAlgorithmResult, IoTxAgeGenderRecognitionEvent, IoTxAlgorithmCodes, IoTxAlgorithmCode
 
@@ -22,6 +23,9 @@ plugin_dirs = os.environ['OPENVINO_PLUGIN_DIR']
 exec_net = None
 input_blob = None
 output_blob = None
+# 批量推理网络，框架检测到batch_inference后会把多个任务的帧组批调用
+MAX_BATCH_SIZE = 8
+batch_exec_net = None
 
 
 # 计算时间函数
@@ -48,6 +52,10 @@ def register():
         "name": __name__,
         "version": "1.0.0",
         "author": "WideZhang",
+        "max_batch_size": MAX_BATCH_SIZE,
+        # 解码直接输出BGR，省去alpha通道和颜色转换；
+        # 也可以用input_width/input_height让解码端缩小，但报警抓拍图会是同样的尺寸
+        "input_format": "BGR",
         "desc":
             '''
             年龄和性别识别
@@ -58,7 +66,7 @@ def register():
 
 def init_model():
     # 初始化
-    global exec_net, input_blob, output_blob
+    global exec_net, input_blob, output_blob, batch_exec_net
     model_xml = model_path + "/age-gender-recognition-retail-0013.xml"
     model_bin = os.path.splitext(model_xml)[0] + ".bin"
     device = 'CPU'  # Specify the target device to infer on; CPU, GPU, FPGA or MYRIAD is acceptable.
@@ -90,11 +98,77 @@ def init_model():
     output_blob = next(iter(net.outputs))
 
     exec_net = plugin.load(network=net)
+    net.batch_size = MAX_BATCH_SIZE
+    batch_exec_net = plugin.load(network=net)
     print(net.inputs)
     print(net.outputs)
     del net
 
 
+def preprocess(array, format_type, w, h):
+    """
+    缩放到网络输入大小并转换成CHW
+    :return: (c, h, w) 的ndarray, 不支持的格式返回None
+    """
+    if format_type == "RGBA":
+        imagesrc = array[:, :, :, 0:3]
+    elif format_type == "BGR":
+        imagesrc = array
+    elif format_type != "RGB":
+        log.error("Not support {}".format(format_type))
+        return None
+    else:
+        """RGB转BGR"""
+        imagesrc = array[:, :, (2, 1, 0)]
+
+    if format_type == "RGBA":
+        image = cv2.resize(imagesrc[0], (w, h))  # RGBA
+    else:
+        image = cv2.resize(imagesrc, (w, h))  # RGB
+    return image.transpose((2, 0, 1))
+
+
+def to_result(res, index):
+    """
+    取出批次中第index个的推理结果
+    :return: IoTxAlgorithmResult
+    """
+    if "age_conv3" in res.keys() and "prob" in res.keys():
+        result = IoTxAlgorithmResult(IoTxAlgorithmCodes.SUCCESS)
+        event = IoTxAgeGenderRecognitionEvent()
+        event.age = res["age_conv3"][index][0][0]*100
+        event.age = float(event.age[0])
+        event.gender = res["prob"][index][0][0]
+        gender = "male"
+        if event.gender >= 0.5:
+            event.gender = "female"
+
+        log.info("age = {}, gender = {}".format(event.age, gender))
+        result.append(event)
+        return result
+    return IoTxAlgorithmResult(IoTxAlgorithmCodes.ALGORITHM_NO_FACE)
+
+
+def batch_inference(batch):
+    """
+    批量推理函数，框架会把多个任务的帧合成一批调用
+    :param batch: [(array, height, width, format_type, raw_type), ...] 不超过MAX_BATCH_SIZE
+    :return: 与batch等长的结果列表
+    """
+    blob_name, rect_shape = input_blob
+    _, c, h, w = rect_shape
+    images = numpy.zeros((MAX_BATCH_SIZE, c, h, w), dtype=numpy.float32)
+    valid = []
+    for i, (array, height, width, format_type, raw_type) in enumerate(batch):
+        image = preprocess(array, format_type, w, h)
+        valid.append(image is not None)
+        if image is not None:
+            images[i] = image
+    res = batch_exec_net.infer(inputs={blob_name: images})
+    return [to_result(res, i) if valid[i] else IoTxAlgorithmResult(IoTxAlgorithmCodes.ALGORITHM_PARAM_ERROR)
+            for i in range(len(batch))]
+
+
 class Model:
     """
         此类的名称不要修改
@@ -109,40 +183,12 @@ class Model:
         :param array:   ndarray 一维结构
         :return: 返回结构体
         """
-        if format_type == "RGBA":
-            imagesrc = array[:, :, :, 0:3]
-        elif format_type != "RGB":
-            log.error("Not support {}".format(format_type))
-        else:
-            """RGB转BGR"""
-            imagesrc = array[:, :, (2, 1, 0)]
-
         blob_name, rect_shape = input_blob
         n, c, h, w = rect_shape
-        if format_type == "RGBA":
-            image = cv2.resize(imagesrc[0], (w, h))  # RGBA
-        else:
-            image = cv2.resize(imagesrc, (w, h))  # RGB
-        image = image.transpose((2, 0, 1))
+        image = preprocess(array, format_type, w, h)
+        if image is None:
+            return IoTxAlgorithmResult(IoTxAlgorithmCodes.ALGORITHM_PARAM_ERROR)
 
         image = image.reshape((n, c, h, w))
         res = exec_net.infer(inputs={blob_name: image})
-        flag = False
-        result = IoTxAlgorithmResult(IoTxAlgorithmCodes.SUCCESS)
-        if "age_conv3" in res.keys() and "prob" in res.keys():
-            flag = True
-            event = IoTxAgeGenderRecognitionEvent()
-            event.age = res["age_conv3"][0][0][0]*100
-            event.age = float(event.age[0])
-            event.gender = res["prob"][0][0][0]
-            gender = "male"
-            if event.gender >= 0.5:
-                event.gender = "female"
-
-            log.info("age = {}, gender = {}".format(event.age, gender))
-            result.append(event)
-        if flag is True:
-            return result
-        else:
-            return IoTxAlgorithmResult(IoTxAlgorithmCodes.ALGORITHM_NO_FACE)
-
+        return to_result(res, 0)
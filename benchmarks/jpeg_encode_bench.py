@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+"""
+jpeg编码性能对比: 旧的opencv路径 vs 各编码器后端, 720p/1080p/4K RGBA
+用法: python3 benchmarks/jpeg_encode_bench.py [-n 50] [-q 85] [--max-width 0]
+"""
+
+import importlib.util
+import os
+import time
+from argparse import ArgumentParser
+
+import cv2
+import numpy
+
+# 直接按文件加载编码模块，避免导入linkai包时启动整个服务
+_jpeg_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "linkai", "utils", "jpeg.py")
+_spec = importlib.util.spec_from_file_location("linkai_jpeg", _jpeg_path)
+jpeg = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(jpeg)
+
+RESOLUTIONS = [("720p", 1280, 720), ("1080p", 1920, 1080), ("4K", 3840, 2160)]
+
+
+def legacy_encode(image_type, pic_width, pic_height, input_buffer):
+    """ 原tools.compress_buf_to_jpg_data实现 """
+    np_arr = numpy.frombuffer(input_buffer, numpy.uint8).copy()
+    color_image = np_arr.reshape(pic_height, pic_width, 4)
+    if image_type == "RGBA":
+        color_image = cv2.cvtColor(color_image, cv2.COLOR_RGBA2BGRA)
+    img_encode = cv2.imencode('.jpg', color_image)[1]
+    return numpy.array(img_encode).tobytes()
+
+
+def make_frame(width, height):
+    """ 渐变加噪声，接近真实画面的压缩难度 """
+    x = numpy.linspace(0, 255, width, dtype=numpy.float32)
+    y = numpy.linspace(0, 255, height, dtype=numpy.float32)[:, None]
+    noise = numpy.random.randint(0, 32, (height, width), dtype=numpy.uint8)
+    frame = numpy.empty((1, height, width, 4), dtype=numpy.uint8)
+    frame[0, :, :, 0] = (x + noise) % 256
+    frame[0, :, :, 1] = (y + noise) % 256
+    frame[0, :, :, 2] = ((x + y) / 2).astype(numpy.uint8)
+    frame[0, :, :, 3] = 255
+    return frame
+
+
+def bench(func, count):
+    func()
+    begin = time.perf_counter()
+    size = 0
+    for _ in range(count):
+        size = len(func())
+    return 1000 * (time.perf_counter() - begin) / count, size
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=50, help="每组编码次数")
+    parser.add_argument("-q", "--quality", type=int, default=85)
+    parser.add_argument("-s", "--subsample", default="420")
+    parser.add_argument("--max-width", type=int, default=0, help="编码前缩放到的最大宽度")
+    args = parser.parse_args()
+
+    encoders = [jpeg.OpenCVJpegEncoder(args.quality, args.subsample, args.max_width)]
+    turbo = jpeg.create_jpeg_encoder("turbojpeg", args.quality, args.subsample, args.max_width)
+    if turbo.name == jpeg.TurboJpegEncoder.name:
+        encoders.append(turbo)
+    else:
+        print("turbojpeg not available, skip")
+
+    print("{:<8}{:<12}{:>12}{:>12}".format("res", "backend", "ms/frame", "bytes"))
+    for name, width, height in RESOLUTIONS:
+        frame = make_frame(width, height)
+        raw = frame.tobytes()
+        cost, size = bench(lambda: legacy_encode("RGBA", width, height, raw), args.count)
+        print("{:<8}{:<12}{:>12.2f}{:>12}".format(name, "legacy", cost, size))
+        for encoder in encoders:
+            cost, size = bench(lambda: encoder.encode(frame, "RGBA", width, height), args.count)
+            print("{:<8}{:<12}{:>12.2f}{:>12}".format(name, encoder.name, cost, size))
+
+
+if __name__ == '__main__':
+    main()
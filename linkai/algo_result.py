@@ -22,6 +22,13 @@ from enum import Enum
 import json
 
 
+def _json_default(o):
+    """ numpy标量和数组转换为python类型，其它对象按属性序列化 """
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    return o.__dict__
+
+
 class IoTxAlgorithmEventType(Enum):
     Undefined = 0  # 未定义
     IllegalParking = 10001  # 违章停车
@@ -100,7 +107,7 @@ class IoTxAlgorithmResult(object):
         self.data.append(algo_event)
 
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return json.dumps(self, default=_json_default)
 
 
 class IoTxAlgorithmEvent(object):
@@ -114,7 +121,7 @@ class IoTxAlgorithmEvent(object):
         self.alarmType = alarmtype.value
 
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return json.dumps(self, default=_json_default)
 
 
 class IoTxClothesCountEvent(IoTxAlgorithmEvent):
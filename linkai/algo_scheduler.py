@@ -0,0 +1,133 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import collections
+import threading
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class InferenceRequest(object):
+    """ 一次推理请求 """
+
+    def __init__(self, image_info, callback):
+        self.image_info = image_info
+        self.callback = callback
+        self.submit_time = time.monotonic()
+
+
+class InferenceScheduler(object):
+    """ 单个算法的跨任务批量推理调度
+
+    各个任务提交帧到调度队列，调度线程按最大批大小和最大等待时间动态组批，
+    调用算法模块的batch_inference(batch)一次推理，再把结果分发给各自的回调。
+    batch为[(array, height, width, format_type, raw_type), ...]，返回等长的IoTxAlgorithmResult列表
+    Attributes:
+        name: 算法名
+        max_batch_size: 最大批大小
+        max_wait_ms: 首个请求最长等待组批时间
+    """
+
+    def __init__(self, name, batch_inference, max_batch_size, max_wait_ms):
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.batches = 0
+        self.frames = 0
+        self._batch_inference = batch_inference
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._exit_flag = False
+        self._thread = threading.Thread(target=self.run, name="Infer-{}".format(name), daemon=True)
+        self._thread.start()
+
+    def submit(self, image_info, callback):
+        """ 异步提交，推理完成后在调度线程中调用callback(result)，失败时result为None """
+        with self._cond:
+            self._queue.append(InferenceRequest(image_info, callback))
+            self._cond.notify()
+
+    def infer(self, image_info):
+        """ 同步推理，阻塞等待本帧所在批次完成 """
+        done = threading.Event()
+        holder = []
+
+        def on_result(result):
+            holder.append(result)
+            done.set()
+
+        self.submit(image_info, on_result)
+        done.wait()
+        return holder[0]
+
+    def stop(self):
+        with self._cond:
+            self._exit_flag = True
+            self._cond.notify()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._exit_flag:
+                self._cond.wait()
+            if self._exit_flag:
+                return []
+            deadline = self._queue[0].submit_time + self.max_wait_ms / 1000
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(self.max_batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(count)]
+
+    def run(self):
+        while not self._exit_flag:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            results = None
+            try:
+                results = self._batch_inference([(req.image_info.array, req.image_info.height,
+                                                  req.image_info.width, req.image_info.format_type,
+                                                  req.image_info.raw_type) for req in batch])
+                if results is None or len(results) != len(batch):
+                    log.error("algorithm={} batch_inference returned {} results for {} frames".format(
+                        self.name, None if results is None else len(results), len(batch)))
+                    results = None
+            except Exception as e:
+                log.error(e, exc_info=True)
+            self.batches += 1
+            self.frames += len(batch)
+            for i, req in enumerate(batch):
+                try:
+                    req.callback(None if results is None else results[i])
+                except Exception as e:
+                    log.error(e, exc_info=True)
+        # 退出时唤醒剩余等待者
+        with self._cond:
+            pending = list(self._queue)
+            self._queue.clear()
+        for req in pending:
+            req.callback(None)
+
+    def get_stats(self):
+        return {"batches": self.batches, "frames": self.frames,
+                "avg_batch_size": self.frames / self.batches if self.batches else 0.0}
@@ -0,0 +1,241 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import importlib.util
+import multiprocessing
+import tempfile
+import logging
+import signal
+import queue
+import time
+import types
+import json
+import mmap
+import uuid
+import sys
+import os
+import numpy
+
+from linkai.algo_result import IoTxAlgorithmResult, IoTxAlgorithmCode
+
+log = logging.getLogger(__name__)
+
+# 主进程里已有GStreamer、Flask和后处理等线程，直接fork可能继承被其它线程持有的锁导致子进程死锁,
+# 子进程由单线程的forkserver进程fork出来，forkserver预先导入本模块
+_mp_context = multiprocessing.get_context("forkserver")
+_mp_context.set_forkserver_preload(["__main__", __name__])
+
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+# 子进程重启失败后，间隔多少秒再尝试
+RESTART_INTERVAL = 5
+
+
+def _worker_main(name, module_path, conn, shm_path):
+    """ 算法子进程入口，加载算法模块创建Model，循环处理父进程的推理请求 """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        sys.path.append(module_path + "/" + name)
+        module_spec = importlib.util.spec_from_file_location(name, module_path + "/" + name + "/model.py")
+        module = importlib.util.module_from_spec(module_spec)
+        module_spec.loader.exec_module(module)
+        info = module.register()
+        model = module.Model()
+    except Exception as e:
+        log.error(e, exc_info=True)
+        conn.send(("error", str(e)))
+        return
+    conn.send(("ready", info))
+
+    fd = os.open(shm_path, os.O_RDWR)
+    mem = None
+    mem_size = 0
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        nbytes, shape, height, width, format_type, raw_type = msg
+        try:
+            if nbytes > mem_size:
+                mem = mmap.mmap(fd, nbytes)
+                mem_size = nbytes
+            array = numpy.frombuffer(mem, dtype=numpy.uint8, count=nbytes).reshape(shape)
+            result = model.image_inference(array, height, width, format_type, raw_type)
+            conn.send(None if result is None else result.to_json())
+        except Exception as e:
+            log.error(e, exc_info=True)
+            conn.send(None)
+    os.close(fd)
+
+
+def _result_from_json(result_json):
+    """ 子进程结果还原为IoTxAlgorithmResult，事件转换为属性对象，保持和进程内推理一致的访问方式 """
+    dct = json.loads(result_json)
+    result = IoTxAlgorithmResult(IoTxAlgorithmCode(dct["code"], dct["desc"]))
+    for event in dct.get("data", []):
+        result.append(types.SimpleNamespace(**event) if isinstance(event, dict) else event)
+    return result
+
+
+class AlgorithmWorker(object):
+    """ 一个算法子进程，帧数据通过/dev/shm共享内存文件传递，控制消息通过Pipe传递 """
+
+    def __init__(self, name, module_path, index):
+        self.name = name
+        self.module_path = module_path
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.info = {}
+        self.shm_path = os.path.join(SHM_DIR, "linkai_{}_{}_{}".format(name, index, uuid.uuid4().hex[:8]))
+        self._fd = None
+        self._mem = None
+        self._mem_size = 0
+        self._next_start = 0.0
+
+    def start(self):
+        self._fd = os.open(self.shm_path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._mem = None
+        self._mem_size = 0
+        parent_conn, child_conn = _mp_context.Pipe()
+        self.process = _mp_context.Process(target=_worker_main, name="Algo-{}-{}".format(self.name, self.index),
+                                           args=(self.name, self.module_path, child_conn, self.shm_path),
+                                           daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        try:
+            status, payload = self.conn.recv()
+        except EOFError:
+            status, payload = "error", "worker exited"
+        if status != "ready":
+            log.error("algorithm={} worker={} start failed error={}".format(self.name, self.index, payload))
+            self.stop()
+            return False
+        self.info = payload
+        log.info("algorithm={} worker={} pid={} ready".format(self.name, self.index, self.process.pid))
+        return True
+
+    def _ensure_size(self, nbytes):
+        if nbytes <= self._mem_size:
+            return
+        os.ftruncate(self._fd, nbytes)
+        self._mem = mmap.mmap(self._fd, nbytes)
+        self._mem_size = nbytes
+
+    def image_inference(self, array, height, width, format_type, raw_type):
+        array = numpy.ascontiguousarray(array, dtype=numpy.uint8)
+        self._ensure_size(array.nbytes)
+        numpy.frombuffer(self._mem, dtype=numpy.uint8, count=array.nbytes)[:] = array.reshape(-1)
+        self.conn.send((array.nbytes, array.shape, height, width, format_type, raw_type))
+        result_json = self.conn.recv()
+        if result_json is None:
+            return None
+        return _result_from_json(result_json)
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def restart(self):
+        """ 重启已退出的子进程，失败后RESTART_INTERVAL秒内不再尝试 """
+        if time.monotonic() < self._next_start:
+            return False
+        self.stop()
+        try:
+            started = self.start()
+        except Exception as e:
+            log.error("algorithm={} worker={} restart error={}".format(self.name, self.index, e), exc_info=True)
+            self.stop()
+            started = False
+        if not started:
+            self._next_start = time.monotonic() + RESTART_INTERVAL
+        return started
+
+    def stop(self):
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            self.process.join(3)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if os.path.exists(self.shm_path):
+            os.remove(self.shm_path)
+
+
+class AlgorithmWorkerPool(object):
+    """ 算法进程池，绕开GIL让多核并行推理
+
+    对外提供和算法Model一致的image_inference接口，调用线程从空闲子进程中取一个执行推理,
+    子进程异常时停止，下次取到时再重启，重启失败的子进程返回空结果，不影响调用线程
+    Attributes:
+        name: 算法名
+        processes: 子进程个数
+        info: 算法register()返回的描述信息
+    """
+    # 每次推理从空闲子进程中取一个，可以被多个线程同时调用
+    thread_safe = True
+
+    def __init__(self, name, module_path, processes):
+        self.name = name
+        self.module_path = module_path
+        self.processes = max(1, processes)
+        self.info = {}
+        self._workers = []
+        self._idle = queue.Queue()
+
+    def start(self):
+        for i in range(self.processes):
+            worker = AlgorithmWorker(self.name, self.module_path, i)
+            if not worker.start():
+                self.stop()
+                return False
+            self.info = worker.info
+            self._workers.append(worker)
+            self._idle.put(worker)
+        return True
+
+    def image_inference(self, array, height, width, format_type, raw_type):
+        worker = self._idle.get()
+        try:
+            if not worker.is_alive() and not worker.restart():
+                return None
+            return worker.image_inference(array, height, width, format_type, raw_type)
+        except Exception as e:
+            log.error("algorithm={} worker={} crashed error={}, restart on next use".format(
+                self.name, worker.index, e))
+            worker.stop()
+            return None
+        finally:
+            self._idle.put(worker)
+
+    def stop(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
@@ -19,18 +19,34 @@
 
 import importlib.util
 import logging
+import threading
 from linkai import conf
+from linkai.algo_scheduler import InferenceScheduler
+from linkai.algo_worker import AlgorithmWorkerPool
 import sys
 import os
 
 log = logging.getLogger(__name__)
 
+# 批量推理默认参数，算法可以在register()返回的信息中用max_batch_size、max_batch_wait_ms覆盖
+BATCH_MAX_SIZE = conf.get_int("Algorithm", "batch_max_size")
+BATCH_MAX_WAIT_MS = conf.get_float("Algorithm", "batch_max_wait_ms")
+# 算法子进程个数，大于0时算法Model运行在子进程中，0表示在本进程中运行
+WORKER_PROCESSES = conf.get_int("Algorithm", "worker_processes")
+
 
 class AlgorithmManager:
     def __init__(self):
         self.path = conf.get_string("Default", "algoModuleDir")
         self.dict_modules = {}
         self.dict_single_modules = {}
+        # 多个任务并发启动时，保证同一个算法模块只加载一次，sys.path的修改也需要互斥
+        self.modules_mutex = threading.Lock()
+        self.dict_schedulers = {}
+        self.schedulers_mutex = threading.Lock()
+        self.worker_processes = WORKER_PROCESSES
+        self.dict_worker_pools = {}
+        self.worker_pools_mutex = threading.Lock()
         # self.dict_module_info = {}
         return
 
@@ -40,26 +56,31 @@ class AlgorithmManager:
         return False
 
     def create_algorithm(self, name, param=None, version=None):
+        if self.worker_processes > 0:
+            return self.get_worker_pool(name)
         try:
+            module = self.load_module(name)
+            # 动态加载 算法模型，模型加载耗时较长，不持有锁，不同任务可以并行创建
+            return module.Model()
+        except Exception as e:
+            log.error(e, exc_info=True)
+
+    def load_module(self, name):
+        with self.modules_mutex:
             if name in self.dict_modules:
                 (module, _) = self.dict_modules[name]
-            else:
-                # module_spec = importlib.util.spec_from_file_location("model", self.path + "/" + name + "/model.py")
-                sys.path.append(self.path + "/" + name)
-                # print(sys.path)
+                return module
+            # module_spec = importlib.util.spec_from_file_location("model", self.path + "/" + name + "/model.py")
+            sys.path.append(self.path + "/" + name)
+            try:
                 module_spec = importlib.util.spec_from_file_location(name, self.path + "/" + name + "/model.py")
                 module = importlib.util.module_from_spec(module_spec)
                 module_spec.loader.exec_module(module)
+            finally:
                 sys.path.pop()
-                # print(sys.path)
-
-                info = module.register()
-                self.dict_modules[name] = (module, info)
-
-            # 动态加载 算法模型
-            return module.Model()
-        except Exception as e:
-            log.error(e, exc_info=True)
+            info = module.register()
+            self.dict_modules[name] = (module, info)
+            return module
 
     def create_algorithm_with_single(self, name, version=None):
         if name in self.dict_single_modules:
@@ -69,11 +90,42 @@ class AlgorithmManager:
             self.dict_single_modules[name] = module
         return module
 
+    def get_worker_pool(self, name):
+        """ 获取算法进程池，同一个算法的所有任务共享，接口与算法Model一致 """
+        with self.worker_pools_mutex:
+            pool = self.dict_worker_pools.get(name)
+            if pool is None:
+                pool = AlgorithmWorkerPool(name, self.path, self.worker_processes)
+                if not pool.start():
+                    return None
+                self.dict_worker_pools[name] = pool
+        return pool
+
     def get_algo_info(self, name):
         info = {}
         if name in self.dict_modules:
             (_, info) = self.dict_modules[name]
+        elif name in self.dict_worker_pools:
+            info = self.dict_worker_pools[name].info
         return info
 
+    def get_scheduler(self, name):
+        """ 获取算法的批量推理调度器，算法模块没有实现batch_inference时返回None，需要先create_algorithm加载模块 """
+        if name not in self.dict_modules:
+            return None
+        (module, info) = self.dict_modules[name]
+        if not hasattr(module, "batch_inference"):
+            return None
+        with self.schedulers_mutex:
+            scheduler = self.dict_schedulers.get(name)
+            if scheduler is None:
+                max_batch_size = int(info.get("max_batch_size", BATCH_MAX_SIZE))
+                max_wait_ms = float(info.get("max_batch_wait_ms", BATCH_MAX_WAIT_MS))
+                scheduler = InferenceScheduler(name, module.batch_inference, max_batch_size, max_wait_ms)
+                self.dict_schedulers[name] = scheduler
+                log.info("algorithm={} batch scheduler max_batch_size={} max_wait_ms={}".format(
+                    name, max_batch_size, max_wait_ms))
+        return scheduler
+
 
 algo_manager = AlgorithmManager()
@@ -18,20 +18,153 @@
 #
 
 import configparser
+import threading
+import logging
+import time
+import types
+import os
 
-conf = configparser.ConfigParser()
+log = logging.getLogger(__name__)
 
+CONF_FILE = "Default.cfg"
 
-def get_string(section, key):
-    conf.read("Default.cfg", "utf-8")
-    return conf.get(section, key)
+# 统一的环境变量覆盖规则: LINKAI_<SECTION>_<KEY>，全部大写
+ENV_PREFIX = "LINKAI_"
 
+# 历史上已经在使用的环境变量，继续兼容
+LEGACY_ENV = {
+    ("default", "httpport"): "HTTP_PORT",
+    ("oss_cfg", "access_key_id"): "ACCESS_KEY_ID",
+    ("oss_cfg", "access_key_secret"): "ACCESS_KEY_SECRET",
+    ("oss_cfg", "bucket_name"): "BUCKET_NAME",
+    ("oss_cfg", "endpoint"): "ENDPOINT",
+    ("linkkit", "product_key"): "PRODUCT_KEY",
+    ("linkkit", "device_name"): "DEVICE_NAME",
+    ("linkkit", "device_secret"): "DEVICE_SECRET",
+}
 
-def get_int(section, key):
-    conf.read("Default.cfg", "utf-8")
-    return conf.getint(section, key)
+_MISSING = object()
 
 
-def get_float(section, key):
-    conf.read("Default.cfg", "utf-8")
-    return conf.getfloat(section, key)
+class Settings(object):
+    """ 一次解析得到的只读配置快照
+
+    section和key不区分大小写，取值时按 LINKAI_<SECTION>_<KEY> > 历史环境变量 > 配置文件 的顺序
+    Attributes:
+        path: 配置文件路径
+        mtime: 解析时配置文件的修改时间
+    """
+
+    def __init__(self, path, mtime, sections):
+        self.path = path
+        self.mtime = mtime
+        self._sections = types.MappingProxyType(
+            {name: types.MappingProxyType(items) for name, items in sections.items()})
+
+    @staticmethod
+    def load(path):
+        parser = configparser.ConfigParser(interpolation=None)
+        mtime = os.path.getmtime(path) if os.path.isfile(path) else 0.0
+        parser.read(path, "utf-8")
+        sections = {name.lower(): {key.lower(): value for key, value in parser.items(name)}
+                    for name in parser.sections()}
+        return Settings(path, mtime, sections)
+
+    def _raw(self, section, key):
+        section = section.lower()
+        key = key.lower()
+        env_key = "{}{}_{}".format(ENV_PREFIX, section, key).upper()
+        if env_key in os.environ:
+            return os.environ[env_key]
+        legacy_key = LEGACY_ENV.get((section, key))
+        if legacy_key is not None and legacy_key in os.environ:
+            return os.environ[legacy_key]
+        if section not in self._sections:
+            raise configparser.NoSectionError(section)
+        items = self._sections[section]
+        if key not in items:
+            raise configparser.NoOptionError(key, section)
+        return items[key]
+
+    def get(self, section, key, convert=str, fallback=_MISSING):
+        try:
+            return convert(self._raw(section, key))
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            if fallback is _MISSING:
+                raise
+            return fallback
+
+    def sections(self):
+        return list(self._sections.keys())
+
+    def items(self, section):
+        return dict(self._sections.get(section.lower(), {}))
+
+
+def _to_bool(value):
+    value = value.strip().lower()
+    if value in ("1", "yes", "true", "on"):
+        return True
+    if value in ("0", "no", "false", "off", ""):
+        return False
+    raise ValueError("not a boolean: {}".format(value))
+
+
+_settings = Settings.load(CONF_FILE)
+_mutex = threading.Lock()
+_next_check = 0.0
+
+
+def _reload_interval():
+    # 0表示不热加载
+    return _settings.get("Default", "conf_reload_interval", float, 0.0)
+
+
+def settings():
+    """ 当前配置快照，开启热加载时按间隔检查文件修改时间，变化后重新解析 """
+    global _settings, _next_check
+    interval = _reload_interval()
+    if interval <= 0:
+        return _settings
+    now = time.monotonic()
+    if now < _next_check:
+        return _settings
+    with _mutex:
+        if now < _next_check:
+            return _settings
+        _next_check = now + interval
+        try:
+            mtime = os.path.getmtime(_settings.path)
+        except OSError:
+            return _settings
+        if mtime != _settings.mtime:
+            try:
+                _settings = Settings.load(_settings.path)
+                log.info("config file={} reloaded".format(_settings.path))
+            except configparser.Error as e:
+                log.error("config file={} reload failed error={}".format(_settings.path, e))
+    return _settings
+
+
+def reload():
+    """ 强制重新解析配置文件 """
+    global _settings
+    with _mutex:
+        _settings = Settings.load(_settings.path)
+    return _settings
+
+
+def get_string(section, key, fallback=_MISSING):
+    return settings().get(section, key, str, fallback)
+
+
+def get_int(section, key, fallback=_MISSING):
+    return settings().get(section, key, int, fallback)
+
+
+def get_float(section, key, fallback=_MISSING):
+    return settings().get(section, key, float, fallback)
+
+
+def get_bool(section, key, fallback=_MISSING):
+    return settings().get(section, key, _to_bool, fallback)
@@ -201,22 +201,13 @@ def on_thing_event_post(event, request_id, code, data, reply_message, user_data)
 if "LINKKIT_LOADED" not in os.environ:
     os.environ.setdefault("LINKKIT_LOADED", "TRUE")
     host_name = conf.get_string("LinkKit", "host_name")
-    if "PRODUCT_KEY" in os.environ:
-        product_key = os.environ["PRODUCT_KEY"]
-    else:
-        product_key = conf.get_string("LinkKit", "product_key")
+    product_key = conf.get_string("LinkKit", "product_key")
     log.info("product_key={}".format(product_key))
 
-    if "DEVICE_NAME" in os.environ:
-        device_name = os.environ["DEVICE_NAME"]
-    else:
-        device_name = conf.get_string("LinkKit", "device_name")
+    device_name = conf.get_string("LinkKit", "device_name")
     log.info("device_name={}".format(device_name))
 
-    if "DEVICE_SECRET" in os.environ:
-        device_secret = os.environ["DEVICE_SECRET"]
-    else:
-        device_secret = conf.get_string("LinkKit", "device_secret")
+    device_secret = conf.get_string("LinkKit", "device_secret")
     log.info("device_secret={}".format(device_secret))
 
     platform = conf.get_string("LinkKit", "platform")
@@ -17,8 +17,6 @@
 #
 #
 
-from linkai.media.manager import media_manager
-from linkai.service.service import app
 from linkai import conf
 import logging as log
 import logging.config
@@ -36,10 +34,7 @@ if os.path.isfile("log.conf"):
 else:
     log.basicConfig(level=log.INFO)
 
-if "HTTP_PORT" in os.environ:
-    http_port = os.environ["HTTP_PORT"]
-else:
-    http_port = conf.get_int("Default", "httpPort")
+http_port = conf.get_int("Default", "httpPort")
 
 
 def build_arg_parser():
@@ -49,10 +44,17 @@ def build_arg_parser():
 
 
 def main():
+    # 单件在main中导入，算法子进程通过forkserver启动时会重新导入本模块，不能在模块级别初始化媒体、任务和服务
+    from linkai.media.manager import media_manager
+    from linkai.task.manager import task_manager
+    from linkai.service.service import app
+
     args = build_arg_parser().parse_args()
     media_manager.gst_bus_loop_start()
 
     log.info("Start Link AI")
+    # 恢复重启前的任务
+    task_manager.restore_tasks()
 
     if args.linkkit or "LINK_KIT" in os.environ:
         adapter_path = os.path.split(__file__)[0] + "/linkkit/linkkit_adapter.py"
@@ -17,10 +17,19 @@
 #
 #
 
+import threading
+import random
+import time
 import gi
-import numpy
 import logging
+import numpy
 from ctypes import *
+from linkai import conf
+from ..frame_ring import FrameRing
+from ..output_caps import OutputCaps, DecodeMode, LatencyPolicy, PIXEL_BYTES, frame_rows, frame_shape
+from ..media_stats import MediaStats
+from ..frame_header import StreamDescriptor, FrameHeader
+from ..uri import is_file_uri
 
 # ll = cdll.LoadLibrary
 # lib = ll("./libpycall.so")
@@ -31,6 +40,24 @@ from gi.repository import GObject, Gst
 
 log = logging.getLogger(__name__)
 
+# avdec_*解码器skip-frame属性取值: 1 跳过B帧
+AVDEC_SKIP_B_FRAMES = 1
+
+FRAME_RING_CAPACITY = conf.get_int("Media", "frame_ring_capacity")
+# 解码后队列的最大帧数
+QUEUE_MAX_BUFFERS = 5
+# gst queue的leaky属性: 2 队列满时丢弃最老的帧
+QUEUE_LEAKY_DOWNSTREAM = 2
+
+# 断线重连: 首次重连延时和最大延时(秒)，延时按指数退避并加上随机抖动，避免多路流同时重连
+RECONNECT_MIN_DELAY = conf.get_float("Media", "reconnect_min_delay")
+RECONNECT_MAX_DELAY = conf.get_float("Media", "reconnect_max_delay")
+RECONNECT_JITTER = conf.get_float("Media", "reconnect_jitter")
+# 连续重连失败多少次后放弃，0表示一直重连
+RECONNECT_MAX_ATTEMPTS = conf.get_int("Media", "reconnect_max_attempts")
+# 分段播放时等待pipeline预卷完成再seek的最长时间(秒)
+SEGMENT_PREROLL_TIMEOUT = 10
+
 
 class _MapInfo(Structure):
     _fields_ = [
@@ -46,16 +73,49 @@ class Media(object):
     已经对各种回调媒体类型的数据进行处理，例如h264,rgba
     Attributes:
         uri: 流媒体URI，支持本地文件,rtsp,rtmp
-        listener: 监听类，媒体回调数据会通过Listener的on_frame_h264等回调
-        stream_id: 流媒体标识Id
+        listeners: 监听类集合{stream_id: listener}，媒体回调数据会通过Listener的on_frame_h264等回调,
+                   同一路流的多个任务共享一个pipeline，每帧分发给所有listener
+        stream_id: 流媒体标识Id，共享时为第一个打开者的Id
         pipeline: gstreamer的一个pipline
+        frame_ring: cpu帧环，解码帧拷贝一次后供所有listener租用
+        failed: 重连次数用尽或已停止，不再让新的任务共享
+        output_caps: 解码输出的尺寸和像素格式，在pipeline内完成缩放和颜色转换
+        stats: 解码、送达、丢弃帧数和pts延时统计
+        appsink: 拉模式下任务线程从这个appsink取帧
+        descriptor: 缓存的流描述(尺寸、格式、帧率)，只在caps事件时更新
+        caps_memory: 输出caps的memory特性，例如NVMM
+        reconnect_attempts: 当前连续重连次数，收到首帧后清零
+        segment: 分段播放的(start_ns, stop_ns)，None为整个文件
     """
+    # 能否由任务线程从appsink拉帧，不支持时只有帧回调，回放依赖拉模式
+    pull_supported = True
 
     def __init__(self, stream_id, uri, listener):
         self.uri = uri
-        self.listener = listener
         self.stream_id = stream_id
+        self.listeners = {} if listener is None else {stream_id: listener}
+        self.listeners_mutex = threading.Lock()
+        self.failed = False
+        self.share_key = None
+        self.output_caps = OutputCaps()
+        self.stats = MediaStats()
+        self.appsink = None
+        self.pull_mutex = threading.Lock()
+        self.descriptor = None
+        self.caps_memory = None
+        self.segment = None
+        # 按回调方法缓存的listener列表，listener变化时清空
+        self._listener_cache = {}
         self.pipeline = None
+        self.stopped = False
+        self.eos = False
+        self.reconnect_attempts = 0
+        self._reconnect_timer = None
+        self._play_time = 0.0
+        self._wait_first_frame = False
+        # 保护pipeline状态切换、重连定时器和停止标志
+        self.state_mutex = threading.RLock()
+        self.frame_ring = FrameRing(FRAME_RING_CAPACITY)
         self.is_first_frame_cpu = True
         self.is_first_frame_h264 = True
         self.is_first_frame_nvidia_gpu = True
@@ -63,82 +123,375 @@ class Media(object):
     def get_uri(self):
         return self.uri
 
+    def set_output_caps(self, output_caps):
+        """ 需要在start之前设置 """
+        self.output_caps = output_caps or OutputCaps()
+
+    def set_segment(self, start_ns, stop_ns=None):
+        """ 只播放文件的[start_ns, stop_ns)，stop_ns为None时播放到结尾，需要在start之前设置 """
+        self.segment = (start_ns, stop_ns)
+
+    def add_listener(self, stream_id, listener):
+        # 拷贝后替换，回调线程遍历时不需要加锁
+        with self.listeners_mutex:
+            listeners = dict(self.listeners)
+            listeners[stream_id] = listener
+            self.listeners = listeners
+            self._listener_cache = {}
+        self.frame_ring.ensure_capacity(FRAME_RING_CAPACITY + len(listeners) - 1)
+        # 后加入的listener不会再收到caps事件，直接告知帧率
+        descriptor = self.descriptor
+        if descriptor is not None and descriptor.framerate > 0 and hasattr(listener, "set_framerate"):
+            listener.set_framerate(descriptor.framerate)
+
+    def remove_listener(self, stream_id):
+        """ 移除listener，返回剩余的listener个数 """
+        with self.listeners_mutex:
+            listeners = dict(self.listeners)
+            listeners.pop(stream_id, None)
+            self.listeners = listeners
+            self._listener_cache = {}
+            return len(listeners)
+
+    def get_listeners(self, method):
+        """ 实现了回调方法method的listener """
+        cache = self._listener_cache
+        listeners = cache.get(method)
+        if listeners is None:
+            listeners = [listener for listener in self.listeners.values() if hasattr(listener, method)]
+            cache[method] = listeners
+        return listeners
+
+    def update_descriptor(self, caps):
+        """ caps变化时重新解析流描述，并通知listener新的帧率 """
+        descriptor = StreamDescriptor.from_caps(caps)
+        if self.caps_memory is not None and descriptor.mem_type.find(self.caps_memory) == -1:
+            descriptor.mem_type = "{}(memory:{})".format(descriptor.mem_type, self.caps_memory)
+        self.descriptor = descriptor
+        log.info("stream_id[{}] caps changed height[{}] width[{}] format[{}] framerate[{}]".format(
+            self.stream_id, descriptor.height, descriptor.width, descriptor.format_type, descriptor.framerate))
+        if descriptor.framerate > 0:
+            for listener in self.get_listeners("set_framerate"):
+                listener.set_framerate(descriptor.framerate)
+        return descriptor
+
+    def get_descriptor(self, sample):
+        descriptor = self.descriptor
+        if descriptor is None:
+            descriptor = self.update_descriptor(sample.get_caps())
+        return descriptor
+
+    def on_sink_event(self, pad, info):
+        """ appsink输入端的caps事件，更新缓存的流描述 """
+        event = info.get_event()
+        if event is not None and event.type == Gst.EventType.CAPS:
+            self.update_descriptor(event.parse_caps())
+        return Gst.PadProbeReturn.OK
+
     def __del__(self):
         pass
 
     def start(self):
-        """ 拉流启动，具体的Pipline组成由各个子类自己实现,子类的回调实现必须在父类这里实现，例如on_frame_h264,便于各个子类复用 """
+        """ 拉流启动，具体的Pipline组成由各个子类自己实现,子类的回调实现必须在父类这里实现，例如on_frame_h264,便于各个子类复用
+        子类组装完pipeline后调用play，由launch开始播放 """
         self.is_first_frame_cpu = True
         self.is_first_frame_h264 = True
         self.is_first_frame_nvidia_gpu = True
 
+        with self.state_mutex:
+            self.teardown()
+            self.stopped = False
+            self.reconnect_attempts = 0
+            self.pipeline = Gst.Pipeline.new(None)
+        self.descriptor = None
+        # uridecodebin内部的解码器是动态创建的，在加入pipeline时按解码模式设置
+        if self.output_caps.decode_mode != DecodeMode.ALL:
+            self.pipeline.connect("deep-element-added", self.on_element_added)
+
+    def launch(self):
+        """ 组装pipeline并开始播放，由MediaManager在释放streams_mutex之后调用
+
+        组装时持有state_mutex，避免和stop交错；分段播放的预卷和seek可能耗时数秒，在锁外进行
+        """
+        with self.state_mutex:
+            if self.stopped:
+                return
+            self.start()
+        self.set_playing()
+
+    def play(self):
+        """ 关注bus上的eos和error消息，播放由launch或reconnect开始 """
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message::eos", self.on_eos)
+        bus.connect("message::error", self.on_error)
+
+    def set_playing(self):
+        """ 开始播放，不持有state_mutex，期间被stop时恢复到NULL """
+        pipeline = self.pipeline
+        if pipeline is None or self.stopped:
+            return
+        self._play_time = time.monotonic()
+        self._wait_first_frame = True
+        self.eos = False
+        if self.segment is not None and not self.seek_segment(pipeline):
+            log.error("stream_id[{}] seek segment{} failed".format(self.stream_id, self.segment))
+        if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            log.error("stream_id[{}] set pipeline playing failed".format(self.stream_id))
+            if not self.schedule_reconnect():
+                self.failed = True
+        elif self.stopped or pipeline is not self.pipeline:
+            pipeline.set_state(Gst.State.NULL)
+
+    def seek_segment(self, pipeline):
+        """ 预卷后seek到分段起点，从起点之前最近的关键帧开始解码，到分段终点结束 """
+        start, stop = self.segment
+        pipeline.set_state(Gst.State.PAUSED)
+        result, state, pending = pipeline.get_state(SEGMENT_PREROLL_TIMEOUT * Gst.SECOND)
+        if result == Gst.StateChangeReturn.FAILURE:
+            return False
+        flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_BEFORE
+        if stop is None:
+            return pipeline.seek(1.0, Gst.Format.TIME, flags, Gst.SeekType.SET, start, Gst.SeekType.NONE, -1)
+        return pipeline.seek(1.0, Gst.Format.TIME, flags, Gst.SeekType.SET, start, Gst.SeekType.SET, stop)
+
+    def on_first_frame(self):
+        """ 开始播放或重连后的首帧，记录出首帧耗时并清零重连次数 """
+        self._wait_first_frame = False
+        self.reconnect_attempts = 0
+        self.stats.on_first_frame(1000 * (time.monotonic() - self._play_time))
+
+    def is_file(self):
+        """ 本地文件播放结束即结束，不做重连 """
+        return is_file_uri(self.uri)
+
+    @staticmethod
+    def backoff_delay(attempt):
+        """ 第attempt次重连前的等待时间，指数退避加随机抖动 """
+        delay = min(RECONNECT_MAX_DELAY, RECONNECT_MIN_DELAY * (2 ** min(attempt, 16)))
+        return max(0.0, delay * (1 + random.uniform(-RECONNECT_JITTER, RECONNECT_JITTER)))
+
+    def schedule_reconnect(self):
+        """ 停止pipeline释放连接，退避后在同一个pipeline上重新播放，重连次数用尽返回False """
+        with self.state_mutex:
+            if self.stopped or self.pipeline is None:
+                return False
+            if self._reconnect_timer is not None:
+                return True
+            # 回放和分段播放重连会从文件头或分段起点重新解码，已处理的帧会被重复分析，出错直接按失败结束
+            if self.output_caps.replay or self.segment is not None:
+                return False
+            if 0 < RECONNECT_MAX_ATTEMPTS <= self.reconnect_attempts:
+                return False
+            self.pipeline.set_state(Gst.State.NULL)
+            delay = self.backoff_delay(self.reconnect_attempts)
+            self.reconnect_attempts += 1
+            self._reconnect_timer = threading.Timer(delay, self.reconnect)
+            self._reconnect_timer.daemon = True
+            self._reconnect_timer.start()
+        log.warning("stream_id[{}] reconnect attempt[{}] after {:.1f}s".format(
+            self.stream_id, self.reconnect_attempts, delay))
+        return True
+
+    def reconnect(self):
+        with self.state_mutex:
+            self._reconnect_timer = None
+            if self.stopped or self.pipeline is None:
+                return
+            self.stats.incr("reconnects")
+            self.is_first_frame_cpu = True
+            self.is_first_frame_h264 = True
+            self.is_first_frame_nvidia_gpu = True
+        self.set_playing()
+
+    def teardown(self):
+        """ 取消重连，停止pipeline并移除bus监听，调用方需持有state_mutex """
+        if self._reconnect_timer is not None:
+            self._reconnect_timer.cancel()
+            self._reconnect_timer = None
         if self.pipeline is not None:
             self.pipeline.set_state(Gst.State.NULL)
+            self.pipeline.get_bus().remove_signal_watch()
+            self.pipeline = None
+        self.appsink = None
+
+    def on_element_added(self, pipeline, sub_bin, element):
+        """ 视频解码器加入pipeline时按解码模式处理，关键帧模式在解码器输入端丢弃非关键帧，
+        跳过B帧模式使用avdec的skip-frame属性 """
+        factory = element.get_factory()
+        if factory is None:
+            return
+        klass = factory.get_metadata("klass") or ""
+        if "Decoder" not in klass or "Video" not in klass:
+            return
+        decode_mode = self.output_caps.decode_mode
+        if decode_mode == DecodeMode.KEYFRAME:
+            pad = element.get_static_pad("sink")
+            if pad is not None:
+                pad.add_probe(Gst.PadProbeType.BUFFER, self.on_decoder_buffer)
+        elif decode_mode == DecodeMode.SKIP_B:
+            if element.find_property("skip-frame") is None:
+                log.warning("stream_id[{}] decoder[{}] not support skip-frame".format(
+                    self.stream_id, factory.get_name()))
+                return
+            element.set_property("skip-frame", AVDEC_SKIP_B_FRAMES)
+        log.info("stream_id[{}] decoder[{}] decode_mode[{}]".format(self.stream_id, factory.get_name(),
+                                                                   decode_mode))
+
+    def on_decoder_buffer(self, pad, info):
+        """ 关键帧模式，丢弃带DELTA_UNIT标志的压缩帧，解码器只解码关键帧 """
+        buf = info.get_buffer()
+        if buf is not None and buf.has_flags(Gst.BufferFlags.DELTA_UNIT):
+            self.stats.incr("decode_skipped")
+            return Gst.PadProbeReturn.DROP
+        return Gst.PadProbeReturn.OK
+
+    def make_queue(self):
+        """ 解码后的队列，leaky_queue策略时队列满丢弃最老的帧，否则沿用queue2 """
+        if self.output_caps.latency_policy == LatencyPolicy.LEAKY_QUEUE:
+            queue = Gst.ElementFactory.make("queue", None)
+            queue.set_property("leaky", QUEUE_LEAKY_DOWNSTREAM)
+            queue.set_property("max-size-bytes", 0)
+            queue.set_property("max-size-time", 0)
+        else:
+            queue = Gst.ElementFactory.make("queue2", None)
+        queue.set_property("max-size-buffers", QUEUE_MAX_BUFFERS)
+        return queue
+
+    def setup_appsink(self, sink):
+        """ appsink只缓存一帧，drop_oldest策略时新帧到来直接替换旧帧，不阻塞解码。
+        拉模式不发new-sample信号，总是只保留最新一帧，等任务线程来取 """
+        pull = self.output_caps.is_pull() and self.pull_supported
+        self.appsink = sink if pull else None
+        sink.set_property("emit-signals", not pull)
+        sink.set_property("max-buffers", 1)
+        sink.set_property("drop", pull or self.output_caps.latency_policy == LatencyPolicy.DROP_OLDEST)
+        if self.output_caps.replay:
+            # 回放不按时钟同步，任务取走一帧之前解码器阻塞，不丢帧
+            sink.set_property("sync", False)
+            sink.set_property("drop", False)
+            if not pull:
+                log.warning("stream_id[{}] replay without pull mode, frames may be skipped".format(self.stream_id))
+        sink.get_static_pad("sink").add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self.on_sink_event)
 
-        self.pipeline = Gst.Pipeline.new(None)
+    def count_decoded(self, element):
+        """ 在element的输入端统计解码输出的帧数 """
+        element.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self.on_decoded_buffer)
+
+    def on_decoded_buffer(self, pad, info):
+        self.stats.incr("decoded")
+        return Gst.PadProbeReturn.OK
+
+    def pts_lag_ms(self, sample, buf):
+        """ 帧pts换算成运行时间后与pipeline时钟的差值，无法计算时返回None """
+        if buf.pts == Gst.CLOCK_TIME_NONE or self.pipeline is None:
+            return None
+        clock = self.pipeline.get_clock()
+        if clock is None:
+            return None
+        running_time = sample.get_segment().to_running_time(Gst.Format.TIME, buf.pts)
+        if running_time == Gst.CLOCK_TIME_NONE:
+            return None
+        now = clock.get_time() - self.pipeline.get_base_time()
+        return (now - running_time) / 1000000
+
+    def get_stats(self):
+        """ 解码统计，ring_dropped为帧环没有空闲槽位丢弃的帧数 """
+        stats = self.stats.to_dict()
+        stats["ring_dropped"] = self.frame_ring.dropped
+        return stats
 
     def stop(self):
-        """ 拉流关闭 """
-        self.pipeline.set_state(Gst.State.NULL)
+        """ 拉流关闭，停止后不再重连 """
+        with self.state_mutex:
+            self.stopped = True
+            self.failed = True
+            self.teardown()
 
     def on_frame_cpu(self, sink):
         """ 子类cpu数据回调处 """
         sample = sink.emit("pull-sample")
+        slot = self.write_sample(sample)
+        if slot is not None:
+            for listener in self.get_listeners("on_frame_cpu"):
+                listener.on_frame_cpu(slot.array, slot.header)
+        return Gst.FlowReturn.OK
+
+    def write_sample(self, sample):
+        """ 把一帧cpu数据拷贝进帧环，返回写入的槽位，失败返回None """
         buf = sample.get_buffer()
-        caps = sample.get_caps()
-        height = caps.get_structure(0).get_value('height')
-        width = caps.get_structure(0).get_value('width')
-        format_type = caps.get_structure(0).get_value('format')
-        mem_type = caps.get_structure(0).get_name()
-        pts = buf.pts
-        dts = buf.dts
-        duration = buf.duration
+        descriptor = self.get_descriptor(sample)
+        header = FrameHeader(descriptor, buf.pts, buf.dts, buf.duration,
+                             not buf.has_flags(Gst.BufferFlags.DELTA_UNIT))
+        if self.segment is not None and buf.pts != Gst.CLOCK_TIME_NONE:
+            header.stream_time = sample.get_segment().to_stream_time(Gst.Format.TIME, buf.pts)
+        self.stats.on_delivered(self.pts_lag_ms(sample, buf))
+        if self._wait_first_frame:
+            self.on_first_frame()
 
         # buf.map 消耗4ms左右 1920*1080*NV12
         (result, map_info) = buf.map(Gst.MapFlags.READ)
 
         if self.is_first_frame_cpu:
             log.info("first cpu frame accept, stream_id[%s] height[%d] width[%d] type[%s] mem[%s]"
-                     % (self.stream_id, height, width, format_type, mem_type))
+                     % (self.stream_id, header.height, header.width, header.format_type, header.raw_type))
             self.is_first_frame_cpu = False
 
+        slot = None
         if result:
-            # numpy.frombuffer 基本不耗时 1ms以下
-            arr = numpy.frombuffer(map_info.data, dtype=numpy.uint8)
-            if hasattr(self.listener, "on_frame_cpu"):
-                self.listener.on_frame_cpu(array=arr.reshape((1, height, width, 4)),
-                                           height=height, width=width, format_type=format_type,
-                                           raw_type=mem_type, pts=pts, dts=dts, duration=duration)
+            # 拷贝进预分配帧环,unmap之后依然可以安全读取
+            slot = self.frame_ring.write(self.unpad(map_info.data, header.format_type, header.height, header.width),
+                                         frame_shape(header.format_type, header.height, header.width), header)
+            buf.unmap(map_info)
+        return slot
 
-        buf.unmap(map_info)
-        return Gst.FlowReturn.OK
+    def is_eos(self):
+        """ 拉模式下pipeline已经播放结束并且appsink中的帧已经取完 """
+        return self.eos and self.appsink is not None and self.appsink.get_property("eos")
+
+    def pull_frame(self, after_seq=0, timeout_ms=100):
+        """ 拉模式取帧，由任务线程调用
+
+        帧环中已有比after_seq新的帧时不等待，否则最多等待timeout_ms。取到的最新一帧写入帧环后租用，
+        同一路流的多个订阅者共享帧环，没有新帧返回None
+        """
+        if self.appsink is None:
+            return None
+        with self.pull_mutex:
+            timeout = 0 if self.frame_ring.latest_seq() > after_seq else timeout_ms * Gst.MSECOND
+            sample = self.appsink.emit("try-pull-sample", timeout)
+            if sample is not None:
+                self.write_sample(sample)
+        return self.frame_ring.lease_latest(after_seq)
+
+    @staticmethod
+    def unpad(data, format_type, height, width):
+        """ RGB等格式宽度不是4的倍数时gstreamer每行会补齐到4字节对齐，返回去掉补齐后的视图，不拷贝 """
+        row_bytes = width * PIXEL_BYTES.get(format_type, 4)
+        rows = frame_rows(format_type, height)
+        if len(data) == row_bytes * rows:
+            return data
+        stride = len(data) // rows
+        return numpy.frombuffer(data, dtype=numpy.uint8, count=stride * rows).reshape(rows, stride)[:, :row_bytes]
 
     def on_frame_h264(self, sink):
         """ 子类h264数据回调处 """
         sample = sink.emit("pull-sample")
         buf = sample.get_buffer()
-        caps = sample.get_caps()
-        height = caps.get_structure(0).get_value('height')
-        width = caps.get_structure(0).get_value('width')
-        format_type = caps.get_structure(0).get_value('format')
-        mem_type = caps.get_structure(0).get_name()
-        ok, numerator, denominator = caps.get_structure(0).get_fraction("framerate")
-        if ok and hasattr(self.listener, "set_framerate"):
-            framerate = numerator / denominator
-            if framerate > 0:
-                self.listener.set_framerate(numerator / denominator)
+        header = FrameHeader(self.get_descriptor(sample), buf.pts, buf.dts, buf.duration,
+                             not buf.has_flags(Gst.BufferFlags.DELTA_UNIT))
+        if self._wait_first_frame:
+            self.on_first_frame()
 
         # buf.map 消耗4ms左右 1920*1080*NV12
         (result, map_info) = buf.map(Gst.MapFlags.READ)
 
         if self.is_first_frame_h264:
             log.info("first h264 frame accept, stream_id[%s] height[%d] width[%d] mem[%s]"
-                     % (self.stream_id, height, width, mem_type))
+                     % (self.stream_id, header.height, header.width, header.raw_type))
             self.is_first_frame_h264 = False
-        if hasattr(self.listener, "on_frame_h264"):
-            self.listener.on_frame_h264(data=map_info.data,
-                                        height=height, width=width, format_type=format_type,
-                                        raw_type=mem_type)
+        for listener in self.get_listeners("on_frame_h264"):
+            listener.on_frame_h264(map_info.data, header)
         buf.unmap(map_info)
         return Gst.FlowReturn.OK
 
@@ -148,44 +501,43 @@ class Media(object):
         # frame.data = (char *)nvsurface->buf_data[0];
         sample = sink.emit("pull-sample")
         buf = sample.get_buffer()
-        caps = sample.get_caps()
-        height = caps.get_structure(0).get_value('height')
-        width = caps.get_structure(0).get_value('width')
-        format_type = caps.get_structure(0).get_value('format')
-        mem_type = caps.get_structure(0).get_name()
-        if mem_type.find('NVMM') == -1:
-            mem_type = mem_type + "(memory:NVMM)"
-        pts = buf.pts
-        dts = buf.dts
-        duration = buf.duration
+        header = FrameHeader(self.get_descriptor(sample), buf.pts, buf.dts, buf.duration,
+                             not buf.has_flags(Gst.BufferFlags.DELTA_UNIT))
+        self.stats.on_delivered(self.pts_lag_ms(sample, buf))
+        if self._wait_first_frame:
+            self.on_first_frame()
 
         (result, map_info) = buf.map(Gst.MapFlags.READ)
         if self.is_first_frame_nvidia_gpu:
             log.info("first gpu frame accept, stream_id[%s] height[%d] width[%d] mem[%s]"
-                     % (self.stream_id, height, width, mem_type))
+                     % (self.stream_id, header.height, header.width, header.raw_type))
             self.is_first_frame_nvidia_gpu = False
         addr = map_info.__hash__()
         c_map_info = _MapInfo.from_address(addr)
         # lib.foo2(c_long(c_map_info.data))
-        if hasattr(self.listener, "on_frame_gpu"):
-            self.listener.on_frame_gpu(data=c_map_info.data,
-                                       height=height, width=width, format_type=format_type,
-                                       raw_type=mem_type, pts=pts, dts=dts, duration=duration)
+        for listener in self.get_listeners("on_frame_gpu"):
+            listener.on_frame_gpu(c_map_info.data, header)
         buf.unmap(map_info)
         return Gst.FlowReturn.OK
 
     def on_eos(self, bus, msg):
-        """ 拉流结束,一般为本地文件 """
+        """ 拉流结束,本地文件通知listener，网络流视为断线进行重连 """
         log.info("on_eos stream_id[%s]" % self.stream_id)
-        if hasattr(self.listener, "on_eos"):
-            self.listener.on_eos(self, bus, msg)
+        if not self.is_file() and self.schedule_reconnect():
+            return
+        self.eos = True
+        for listener in self.get_listeners("on_eos"):
+            listener.on_eos(self, bus, msg)
 
     def on_error(self, bus, msg):
-        """ 拉流错误回调 """
+        """ 拉流错误回调，先在本pipeline上退避重连，重连次数用尽才通知listener """
         err, debug = msg.parse_error()
         log.error("on_error stream_id[{}] err[{}] debug[{}]".format(self.stream_id, err, debug))
-        if hasattr(self.listener, "on_error"):
-            self.listener.on_error(self, bus, msg)
+        if self.schedule_reconnect():
+            return
+        self.failed = True
+        for listener in self.get_listeners("on_error"):
+            listener.on_error(self, bus, msg)
 
     def on_pad_added(self, element, pad, queue):
         """ 只处理视频，音频及其它不做处理 """
@@ -19,6 +19,7 @@
 import gi
 import logging
 from .media import Media
+from ..source_builder import source_builder
 
 gi.require_version('Gst', '1.0')
 
@@ -27,7 +28,7 @@ from gi.repository import Gst
 log = logging.getLogger(__name__)
 
 
-# 流媒体只出RGBA数据
+# 流媒体按output_caps输出，默认原始尺寸的RGBA数据
 class MediaCpu(Media):
     def __init__(self, stream_id, uri, listener):
         Media.__init__(self, stream_id, uri, listener)
@@ -37,29 +38,32 @@ class MediaCpu(Media):
 
     def start(self):
         Media.start(self)
-        if not Gst.uri_is_valid(self.uri):
-            self.uri = Gst.filename_to_uri(self.uri)
-        source = Gst.ElementFactory.make("uridecodebin", None)
-        source.set_property("uri", self.uri)
-        queue = Gst.ElementFactory.make("queue2", None)
-        queue.set_property("max-size-buffers", 5)
+        queue = self.make_queue()
+        # 先在yuv上缩小再转换颜色，转换的数据量最小，不缩放时videoscale直通
+        scale = Gst.ElementFactory.make("videoscale", None)
         convert = Gst.ElementFactory.make("videoconvert", None)
         sink = Gst.ElementFactory.make("appsink", None)
-        sink.set_property("emit-signals", True)
-        sink.set_property("max-buffers", 1)
-        caps = Gst.caps_from_string("video/x-raw, format=(string){RGBA}")
+        self.setup_appsink(sink)
+        caps = Gst.caps_from_string(self.output_caps.to_caps_string())
         sink.set_property("caps", caps)
-        self.pipeline.add(source)
         self.pipeline.add(queue)
+        self.pipeline.add(scale)
         self.pipeline.add(convert)
         self.pipeline.add(sink)
-        source.connect("pad-added", self.on_pad_added, queue)
-        queue.link(convert)
+        # 按uri和探测到的编码组装 源 -> 解封装 -> 解析 -> 解码，不认识的uri交给uridecodebin
+        decoder = source_builder.build(self.pipeline, self.uri, self.on_pad_added)
+        if decoder is not None:
+            decoder.link(queue)
+        else:
+            if not Gst.uri_is_valid(self.uri):
+                self.uri = Gst.filename_to_uri(self.uri)
+            source = Gst.ElementFactory.make("uridecodebin", None)
+            source.set_property("uri", self.uri)
+            self.pipeline.add(source)
+            source.connect("pad-added", self.on_pad_added, queue)
+        queue.link(scale)
+        self.count_decoded(queue)
+        scale.link(convert)
         convert.link(sink)
         sink.connect("new-sample", self.on_frame_cpu)
-        # Creates a bus and set callbacks to receive errors
-        bus = self.pipeline.get_bus()
-        bus.add_signal_watch()
-        bus.connect("message::eos", self.on_eos)
-        bus.connect("message::error", self.on_error)
-        self.pipeline.set_state(Gst.State.PLAYING)
+        self.play()
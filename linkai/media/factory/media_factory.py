@@ -17,19 +17,105 @@
 #
 #
 
-from .media_cpu import MediaCpu
-from .media_v4l2 import MediaV4L2
-from .media_gpu import MediaGpu
+import importlib
+import threading
+import logging
+
+from linkai import conf
+
+try:
+    from importlib.metadata import entry_points
+except ImportError:
+    entry_points = None
+
+log = logging.getLogger(__name__)
+
+# 第三方媒体类型的entry points组，取值为"模块:类名"
+ENTRY_POINT_GROUP = "linkai.media"
 
 
 class MediaFactory(object):
+    """ 流媒体工厂，按类型名只创建需要的Media
+
+    类型名 -> "模块:类名"，第一次用到时才导入模块，之后缓存类。内置cpu、gpu、v4l2、test，
+    其它类型可以通过配置[Media] media_types(类型名=模块:类名，逗号分隔)或者entry points组linkai.media注册，
+    同名时配置优先于entry points，entry points优先于内置类型
+    """
+    _types = {
+        "cpu": "linkai.media.factory.media_cpu:MediaCpu",
+        "gpu": "linkai.media.factory.media_gpu:MediaGpu",
+        "v4l2": "linkai.media.factory.media_v4l2:MediaV4L2",
+        "test": "linkai.media.factory.media_test:MediaTest",
+    }
+    _classes = {}
+    _plugins_loaded = False
+    _mutex = threading.Lock()
+
+    @classmethod
+    def register(cls, typ, media_class):
+        """ 注册媒体类型，media_class为Media子类或"模块:类名" """
+        with cls._mutex:
+            cls._types[typ] = media_class
+            cls._classes.pop(typ, None)
+
+    @classmethod
+    def _load_plugins(cls):
+        """ 加载entry points和配置中注册的媒体类型，调用方需持有_mutex """
+        if cls._plugins_loaded:
+            return
+        cls._plugins_loaded = True
+        if entry_points is not None:
+            try:
+                eps = entry_points()
+                group = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, "select") \
+                    else eps.get(ENTRY_POINT_GROUP, [])
+                for ep in group:
+                    cls._types[ep.name] = ep.value
+            except Exception as e:
+                log.error("load media entry points failed, error={}".format(e))
+        for item in conf.get_string("Media", "media_types").split(","):
+            if "=" in item:
+                typ, target = item.split("=", 1)
+                cls._types[typ.strip()] = target.strip()
+
+    @classmethod
+    def get_media_class(cls, typ):
+        """ 类型对应的Media类，未知类型或导入失败返回None """
+        with cls._mutex:
+            cls._load_plugins()
+            media_class = cls._classes.get(typ)
+            if media_class is not None:
+                return media_class
+            target = cls._types.get(typ)
+            if target is None:
+                return None
+            if isinstance(target, str):
+                try:
+                    module_name, class_name = target.split(":", 1)
+                    media_class = getattr(importlib.import_module(module_name), class_name)
+                except (ImportError, AttributeError, ValueError) as e:
+                    log.error("load media type={} target={} failed, error={}".format(typ, target, e))
+                    return None
+            else:
+                media_class = target
+            cls._classes[typ] = media_class
+            return media_class
+
+    @classmethod
+    def supports_pull(cls, typ):
+        """ 类型对应的Media能否拉模式取帧，未知类型返回False """
+        media_class = cls.get_media_class(typ)
+        return media_class is not None and getattr(media_class, "pull_supported", True)
+
     @staticmethod
     def create_media(typ, stream_id, uri, listener):
-        if uri == "local":
-            typ = 'v4l2'
-        map_ = {
-            'cpu': MediaCpu(stream_id, uri, listener),
-            'v4l2': MediaV4L2(stream_id, uri, listener),
-            'gpu': MediaGpu(stream_id, uri, listener),
-        }
-        return map_[typ]
+        """ 创建Media，未知类型返回None """
+        if uri == "local" or uri.lower().startswith("v4l2://"):
+            typ = "v4l2"
+        elif uri.lower().startswith("test://"):
+            typ = "test"
+        media_class = MediaFactory.get_media_class(typ)
+        if media_class is None:
+            log.error("create media stream_id={} unknown type={}".format(stream_id, typ))
+            return None
+        return media_class(stream_id, uri, listener)
@@ -20,6 +20,8 @@
 import gi
 import logging
 from .media import Media
+from ..output_caps import OutputCaps
+from ..source_builder import source_builder
 import os
 
 gi.require_version('Gst', '1.0')
@@ -42,75 +44,53 @@ gst-launch-1.0 filesrc location="/AII/ladc/snapshot/I05/20180808/IMAG2363.AVI" !
 
 # 流媒体只出RGB数据
 class MediaGpu(Media):
+    # gpu帧是显存指针，只在回调期间有效，不支持拉模式
+    pull_supported = False
+
     def __init__(self, stream_id, uri, listener):
         Media.__init__(self, stream_id, uri, listener)
+        self.caps_memory = "NVMM"
 
     def __del__(self):
         pass
 
     def start(self):
         Media.start(self)
-        if self.uri.startswith("rtmp://"):
-            source = Gst.ElementFactory.make("rtmpsrc", None)
-            source.set_property("location", self.uri)
-            demux = Gst.ElementFactory.make("flvdemux", None)
-        elif self.uri.startswith("rtsp://"):
-            source = Gst.ElementFactory.make("rtspsrc", None)
-            source.set_property("location", self.uri)
-            demux = Gst.ElementFactory.make("rtph264depay", None)
-        elif self.uri.endswith(".mp4") or self.uri.endswith(".MP4") or self.uri.endswith(".m4v") or self.uri.endswith(
-                ".M4V"):
-            source = Gst.ElementFactory.make("filesrc", None)
-            source.set_property("location", self.uri)
-            demux = Gst.ElementFactory.make("qtdemux", None)
-        elif self.uri.endswith(".avi") or self.uri.endswith(".AVI"):
-            source = Gst.ElementFactory.make("filesrc", None)
-            source.set_property("location", self.uri)
-            demux = Gst.ElementFactory.make("avidemux", None)
-        else:
-            log.error("media start,not support uri={}".format(self.uri))
-            return
-        queue = Gst.ElementFactory.make("queue2", None)
-        queue.set_property("max-size-buffers", 5)
-        h264parse = Gst.ElementFactory.make("h264parse", None)
-        h264parse.set_property("config-interval", 1)
-        nvdec_h264 = Gst.ElementFactory.make("nvdec_h264", None)
         device = 0
         if os.environ.get("GPU_ID") is not None:
             device = int(os.environ.get("GPU_ID"))
-        nvdec_h264.set_property("gpu-id", device)
         gpu_convert = Gst.ElementFactory.make("nvvidconv", None)
         gpu_convert.set_property("gpu-id", device)
+        # 按uri和探测到的编码组装 源 -> 解封装 -> 解析 -> 解码，不认识的uri交给uridecodebin
+        decoder = source_builder.build(self.pipeline, self.uri, self.on_pad_added, gpu=True)
+        if decoder is not None:
+            if decoder.find_property("gpu-id") is not None:
+                decoder.set_property("gpu-id", device)
+        else:
+            log.warning("media start, source builder not available for uri={}, use uridecodebin".format(self.uri))
+            if not Gst.uri_is_valid(self.uri):
+                self.uri = Gst.filename_to_uri(self.uri)
+            source = Gst.ElementFactory.make("uridecodebin", None)
+            source.set_property("uri", self.uri)
+            self.pipeline.add(source)
+            source.connect("pad-added", self.on_pad_added, gpu_convert)
         gpu_sink = Gst.ElementFactory.make("appsink", None)
-        gpu_sink.set_property("emit-signals", True)
-        gpu_sink.set_property("max-buffers", 1)
-        caps = Gst.caps_from_string("video/x-raw(memory:NVMM), format=(string){RGBA}")
+        self.setup_appsink(gpu_sink)
+        # nvvidconv只负责缩放，gpu输出固定为RGBA
+        output_caps = OutputCaps(self.output_caps.width, self.output_caps.height, "RGBA",
+                                 self.output_caps.decode_mode)
+        if self.output_caps.format_type != output_caps.format_type:
+            log.warning("gpu media only output RGBA, ignore format={}".format(self.output_caps.format_type))
+        caps = Gst.caps_from_string(output_caps.to_caps_string("NVMM"))
         gpu_sink.set_property("caps", caps)
-        self.pipeline.add(source)
-        self.pipeline.add(demux)
-        self.pipeline.add(queue)
-        self.pipeline.add(h264parse)
-        self.pipeline.add(nvdec_h264)
         self.pipeline.add(gpu_convert)
         self.pipeline.add(gpu_sink)
-
-        if self.uri.startswith("rtsp://"):
-            source.connect("pad-added", self.on_pad_added, demux)
-            demux.link(queue)
-        else:
-            source.link(demux)
-            demux.connect("pad-added", self.on_pad_added, queue)
-        queue.link(h264parse)
-        h264parse.link(nvdec_h264)
-        nvdec_h264.link(gpu_convert)
+        if decoder is not None:
+            decoder.link(gpu_convert)
         gpu_convert.link(gpu_sink)
+        self.count_decoded(gpu_convert)
         gpu_sink.connect("new-sample", self.on_frame_gpu)
-        # Creates a bus and set callbacks to receive errors
-        bus = self.pipeline.get_bus()
-        bus.add_signal_watch()
-        bus.connect("message::eos", self.on_eos)
-        bus.connect("message::error", self.on_error)
-        self.pipeline.set_state(Gst.State.PLAYING)
+        self.play()
 
     # def start(self):
     #     Media.start(self)
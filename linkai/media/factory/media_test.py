@@ -0,0 +1,85 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+from urllib.parse import urlsplit, parse_qs
+from fractions import Fraction
+import gi
+import logging
+from .media import Media
+
+gi.require_version('Gst', '1.0')
+
+from gi.repository import Gst
+
+log = logging.getLogger(__name__)
+
+
+# videotestsrc合成视频源，不需要摄像头和文件，用于压测
+# uri: test://?pattern=ball&width=1920&height=1080&fps=25&format=NV12&live=1&num_buffers=-1
+# live=0时不按帧率限速，尽可能快地产生帧；num_buffers大于0时产生指定帧数后结束
+class MediaTest(Media):
+    def __init__(self, stream_id, uri, listener):
+        Media.__init__(self, stream_id, uri, listener)
+        query = {key: values[-1] for key, values in parse_qs(urlsplit(uri).query).items()}
+        self.pattern = query.get("pattern", "smpte")
+        self.source_format = query.get("format", "I420").upper()
+        try:
+            self.width = int(query.get("width", 1920))
+            self.height = int(query.get("height", 1080))
+            self.fps = float(query.get("fps", 25))
+            self.live = int(query.get("live", 1)) == 1
+            self.num_buffers = int(query.get("num_buffers", -1))
+        except ValueError as e:
+            log.error("test uri={} param error={}".format(uri, e))
+            self.width, self.height, self.fps, self.live, self.num_buffers = 1920, 1080, 25.0, True, -1
+
+    def __del__(self):
+        pass
+
+    def is_file(self):
+        # 指定帧数的测试源播放结束即结束，不做重连
+        return self.num_buffers > 0
+
+    def start(self):
+        Media.start(self)
+        src = Gst.ElementFactory.make("videotestsrc", None)
+        src.set_property("pattern", self.pattern)
+        src.set_property("is-live", self.live)
+        src.set_property("num-buffers", self.num_buffers)
+        fraction = Fraction(self.fps).limit_denominator(1001)
+        capsfilter = Gst.ElementFactory.make("capsfilter", None)
+        capsfilter.set_property("caps", Gst.caps_from_string(
+            "video/x-raw, format=(string){}, width=(int){}, height=(int){}, framerate=(fraction){}/{}".format(
+                self.source_format, self.width, self.height, fraction.numerator, fraction.denominator)))
+        queue = self.make_queue()
+        scale = Gst.ElementFactory.make("videoscale", None)
+        convert = Gst.ElementFactory.make("videoconvert", None)
+        sink = Gst.ElementFactory.make("appsink", None)
+        sink.set_property("caps", Gst.caps_from_string(self.output_caps.to_caps_string()))
+        self.setup_appsink(sink)
+        if not self.live:
+            sink.set_property("sync", False)
+        elements = [src, capsfilter, queue, scale, convert, sink]
+        for element in elements:
+            self.pipeline.add(element)
+        for i in range(len(elements) - 1):
+            elements[i].link(elements[i + 1])
+        self.count_decoded(queue)
+        sink.connect("new-sample", self.on_frame_cpu)
+        self.play()
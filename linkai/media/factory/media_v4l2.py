@@ -20,6 +20,7 @@
 import gi
 import logging
 from .media import Media
+from ..v4l2_params import V4L2Params, IO_MODES
 
 gi.require_version('Gst', '1.0')
 
@@ -28,38 +29,60 @@ from gi.repository import GObject, Gst
 log = logging.getLogger(__name__)
 
 
-# v4l2只出本地摄像头的rgb流
+# v4l2本地摄像头，按uri限定采集的设备、分辨率、帧率和格式，mjpeg摄像头用jpegdec解码
 class MediaV4L2(Media):
     def __init__(self, stream_id, uri, listener):
         Media.__init__(self, stream_id, uri, listener)
+        self.params = V4L2Params.from_uri(uri)
 
     def __del__(self):
         pass
 
+    def make_source(self):
+        """ 采集源到解码后的原始帧，返回element列表，按顺序连接 """
+        params = self.params
+        if params.is_test():
+            src = Gst.ElementFactory.make("videotestsrc", None)
+            src.set_property("is-live", True)
+        else:
+            src = Gst.ElementFactory.make("v4l2src", None)
+            src.set_property("device", params.device)
+            src.set_property("io-mode", IO_MODES[params.io_mode])
+        elements = [src]
+        caps_string = params.to_caps_string(encoded=not params.is_test())
+        if caps_string is not None:
+            capsfilter = Gst.ElementFactory.make("capsfilter", None)
+            capsfilter.set_property("caps", Gst.caps_from_string(caps_string))
+            elements.append(capsfilter)
+        if params.is_mjpeg():
+            if params.is_test():
+                # 测试源模拟mjpeg摄像头
+                elements.append(Gst.ElementFactory.make("jpegenc", None))
+            elements.append(Gst.ElementFactory.make("jpegdec", None))
+        return elements
+
     def start(self):
         Media.start(self)
+        log.info("v4l2 stream_id[{}] params={}".format(self.stream_id, self.params.to_dict()))
         # Create elements
-        src = Gst.ElementFactory.make('v4l2src', None)
+        elements = self.make_source()
+        queue = self.make_queue()
+        scale = Gst.ElementFactory.make("videoscale", None)
         convert = Gst.ElementFactory.make("videoconvert", None)
         sink = Gst.ElementFactory.make('appsink', None)
-        caps = Gst.caps_from_string("video/x-raw, format=RGBA")
+        caps = Gst.caps_from_string(self.output_caps.to_caps_string())
         sink.set_property("caps", caps)
+        elements += [queue, scale, convert, sink]
         # Add elements to pipeline
-        self.pipeline.add(src)
-        self.pipeline.add(convert)
-        self.pipeline.add(sink)
+        for element in elements:
+            self.pipeline.add(element)
         # Set properties
-        src.set_property('device', "/dev/video0")
-        sink.set_property('emit-signals', True)
+        self.setup_appsink(sink)
         # turns off sync to make decoding as fast as possible
         sink.set_property('sync', False)
         sink.connect('new-sample', self.on_frame_cpu)
         # Link elements
-        src.link(convert)
-        convert.link(sink)
-        # Creates a bus and set callbacks to receive errors
-        bus = self.pipeline.get_bus()
-        bus.add_signal_watch()
-        bus.connect("message::eos", self.on_eos)
-        bus.connect("message::error", self.on_error)
-        self.pipeline.set_state(Gst.State.PLAYING)
+        for i in range(len(elements) - 1):
+            elements[i].link(elements[i + 1])
+        self.count_decoded(queue)
+        self.play()
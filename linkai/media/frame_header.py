@@ -0,0 +1,69 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+
+class StreamDescriptor(object):
+    """ 流的输出描述，只在caps变化时解析一次，缓存在Media上
+
+    Attributes:
+        height: 帧高
+        width: 帧宽
+        format_type: 像素格式，例如RGBA
+        mem_type: caps名，例如video/x-raw
+        framerate: 帧率，caps中没有时为0
+    """
+    __slots__ = ("height", "width", "format_type", "mem_type", "framerate")
+
+    def __init__(self, height, width, format_type, mem_type, framerate=0.0):
+        self.height = height
+        self.width = width
+        self.format_type = format_type
+        self.mem_type = mem_type
+        self.framerate = framerate
+
+    @staticmethod
+    def from_caps(caps):
+        structure = caps.get_structure(0)
+        ok, numerator, denominator = structure.get_fraction("framerate")
+        framerate = numerator / denominator if ok and numerator > 0 and denominator > 0 else 0.0
+        return StreamDescriptor(structure.get_value("height"), structure.get_value("width"),
+                                structure.get_value("format"), structure.get_name(), framerate)
+
+
+class FrameHeader(object):
+    """ 帧头，随每一帧传给listener，尺寸和格式来自缓存的StreamDescriptor
+
+    Attributes:
+        height/width/format_type/raw_type: 帧尺寸和格式，raw_type为caps名
+        pts/dts/duration: 时间戳(纳秒)
+        keyframe: 是否关键帧
+        stream_time: 分段播放时帧在文件中的位置(纳秒)，其它情况为None
+    """
+    __slots__ = ("height", "width", "format_type", "raw_type", "pts", "dts", "duration", "keyframe", "stream_time")
+
+    def __init__(self, descriptor, pts=None, dts=None, duration=None, keyframe=True, stream_time=None):
+        self.height = descriptor.height
+        self.width = descriptor.width
+        self.format_type = descriptor.format_type
+        self.raw_type = descriptor.mem_type
+        self.pts = pts
+        self.dts = dts
+        self.duration = duration
+        self.keyframe = keyframe
+        self.stream_time = stream_time
@@ -0,0 +1,169 @@
+# -*- coding: UTF-8 -*-#
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import mmap
+import threading
+import logging
+import numpy
+
+log = logging.getLogger(__name__)
+
+
+class FrameSlot(object):
+    """ 帧环中的一个槽位
+
+    槽位内存由匿名mmap预先分配，GstBuffer unmap之后依然可以安全读取
+    Attributes:
+        index: 槽位序号
+        seq: 写入序列号，越大越新
+        array: 按帧形状reshape后的numpy视图
+        lease_count: 当前租约计数，大于0时写入方不会覆盖该槽位
+        header: 帧头FrameHeader，尺寸、格式和时间戳通过属性读取
+    """
+
+    def __init__(self, ring, index, nbytes):
+        self.ring = ring
+        self.index = index
+        self.nbytes = nbytes
+        self._mem = mmap.mmap(-1, nbytes)
+        self._buffer = numpy.frombuffer(self._mem, dtype=numpy.uint8)
+        self.shape = None
+        self.array = None
+        self.seq = 0
+        self.lease_count = 0
+        self.writing = False
+        self.header = None
+
+    height = property(lambda self: self.header.height)
+    width = property(lambda self: self.header.width)
+    format_type = property(lambda self: self.header.format_type)
+    raw_type = property(lambda self: self.header.raw_type)
+    pts = property(lambda self: self.header.pts)
+    dts = property(lambda self: self.header.dts)
+    duration = property(lambda self: self.header.duration)
+    keyframe = property(lambda self: self.header.keyframe)
+    stream_time = property(lambda self: self.header.stream_time)
+
+    def fill(self, data, shape):
+        """ 拷贝一帧数据到槽位，这是整条链路上唯一的一次拷贝 """
+        size = int(numpy.prod(shape))
+        if isinstance(data, numpy.ndarray):
+            # 带行补齐的视图，按帧形状逐行拷贝
+            numpy.copyto(self._buffer[:size].reshape(shape), data.reshape(shape))
+        else:
+            src = numpy.frombuffer(data, dtype=numpy.uint8, count=size)
+            numpy.copyto(self._buffer[:size], src)
+        if self.shape != shape:
+            self.shape = shape
+            self.array = self._buffer[:size].reshape(shape)
+
+    def release(self):
+        """ 归还租约 """
+        self.ring.release(self)
+
+
+class FrameRing(object):
+    """ 每路流固定容量的预分配帧环
+
+    写入方(流媒体回调线程)把解码后的帧拷贝进空闲槽位,读取方通过lease_latest租用最新一帧,
+    用完调用release归还。被租用的槽位和最新槽位不会被覆盖，没有空闲槽位时丢帧并计数
+    Attributes:
+        capacity: 槽位个数
+        dropped: 因无空闲槽位丢弃的帧数
+    """
+
+    def __init__(self, capacity=4):
+        self.capacity = max(2, capacity)
+        self.dropped = 0
+        self._slots = []
+        self._nbytes = 0
+        self._seq = 0
+        self._latest = None
+        self._mutex = threading.Lock()
+
+    def _allocate(self, nbytes):
+        """ 帧大小变化时重新分配，旧槽位如果还被租用由租用方持有直到释放 """
+        log.info("frame ring allocate capacity[{}] slot_bytes[{}]".format(self.capacity, nbytes))
+        self._slots = [FrameSlot(self, i, nbytes) for i in range(self.capacity)]
+        self._nbytes = nbytes
+        self._latest = None
+
+    def ensure_capacity(self, capacity):
+        """ 扩容到至少capacity个槽位，共享流的每个订阅者都可能同时租用一帧 """
+        with self._mutex:
+            if capacity <= self.capacity:
+                return
+            if self._nbytes > 0:
+                self._slots += [FrameSlot(self, i, self._nbytes) for i in range(self.capacity, capacity)]
+            self.capacity = capacity
+
+    def _pick_free(self):
+        free = None
+        for slot in self._slots:
+            if slot.lease_count > 0 or slot.writing or slot is self._latest:
+                continue
+            if free is None or slot.seq < free.seq:
+                free = slot
+        return free
+
+    def write(self, data, shape, header):
+        """ 写入一帧,返回写入的槽位，没有空闲槽位返回None """
+        nbytes = int(numpy.prod(shape))
+        with self._mutex:
+            if nbytes > self._nbytes:
+                self._allocate(nbytes)
+            slot = self._pick_free()
+            if slot is None:
+                self.dropped += 1
+                return None
+            slot.writing = True
+        try:
+            slot.fill(data, shape)
+        except Exception as e:
+            log.error("frame ring write failed, error={}".format(e))
+            with self._mutex:
+                slot.writing = False
+            return None
+        slot.header = header
+        with self._mutex:
+            self._seq += 1
+            slot.seq = self._seq
+            slot.writing = False
+            self._latest = slot
+        return slot
+
+    def lease_latest(self, after_seq=0):
+        """ 租用最新一帧，没有比after_seq更新的帧时返回None """
+        with self._mutex:
+            slot = self._latest
+            if slot is None or slot.seq <= after_seq:
+                return None
+            slot.lease_count += 1
+            return slot
+
+    def release(self, slot):
+        with self._mutex:
+            if slot.lease_count > 0:
+                slot.lease_count -= 1
+
+    def latest_seq(self):
+        with self._mutex:
+            if self._latest is None:
+                return 0
+            return self._latest.seq
@@ -24,6 +24,9 @@ import logging
 
 import gi
 from .factory.media_factory import MediaFactory
+from .uri import normalize_uri
+from .output_caps import OutputCaps
+from .source_builder import source_builder
 
 gi.require_version('Gst', '1.0')
 
@@ -35,9 +38,10 @@ log = logging.getLogger(__name__)
 class MediaManager:
     """ 流媒体管理，单件实例media_manager
 
-    对基类为Media的媒体类进行管理
+    对基类为Media的媒体类进行管理，uri和类型相同的流只拉一路，多个任务共享解码结果
     Attributes:
-        dict_streams: 流媒体集合MAP
+        dict_streams: 流媒体集合MAP，stream_id -> Media
+        dict_shared: 共享流集合MAP，(归一化uri, 类型, 输出规格) -> Media，Media的listener个数即引用计数
     """
 
     def __init__(self):
@@ -46,12 +50,14 @@ class MediaManager:
         Gst.init(None)
 
         self.dict_streams = {}
+        self.dict_shared = {}
+        self.streams_mutex = threading.Lock()
 
     def gst_bus_loop_start(self):
         # 启用一个线程驱动 GObject 这样才能接收到bus上on_msg on_error回调
         threading.Thread(target=lambda: GObject.MainLoop().run(), name="GSTBusLoop").start()
 
-    def open_stream(self, stream_id, uri, listener=None, stream_type="cpu_h264"):
+    def open_stream(self, stream_id, uri, listener=None, stream_type="cpu", output_caps=None, segment=None):
         """ 打开流媒体
         开启流媒体播放，会有不同帧数据进行通过listener的方法回调,例如on_frame_h264
 
@@ -61,20 +67,45 @@ class MediaManager:
             媒体ID,确保唯一
         uri : str
             流媒体播放的uri,例如rtmp://192.168.0.1:1935/stream/test
+        output_caps : OutputCaps
+            解码输出的尺寸和像素格式，None为原始尺寸RGBA，输出规格不同的任务不共享pipeline
+        segment : tuple
+            只播放文件的(start_ns, stop_ns)，分段播放的流不共享
         返回值
         -------
         stream
             返回流媒体类Media,外面需要判空来确定是否打开成功
         """
-        stream = MediaFactory.create_media(stream_type, stream_id, uri, listener)
-        if stream is None:
-            log.error("open stream_id[{}] error total[{}] uri is [{}] type=[{}]".format(
-                stream_id, len(self.dict_streams), uri, stream_type))
-            return None
-        self.dict_streams[stream_id] = stream
-        stream.start()
+        output_caps = output_caps or OutputCaps()
+        key = (normalize_uri(uri), stream_type, output_caps.key())
+        if output_caps.replay or segment is not None:
+            # 回放逐帧拉取，多个任务共享会互相抢帧，每个任务单独解码
+            key += (stream_id,)
+        # 探测可能耗时数秒，在加锁之前完成，start时直接使用缓存的结果
+        source_builder.prepare(uri)
+        with self.streams_mutex:
+            stream = self.dict_shared.get(key)
+            if stream is not None and not stream.failed:
+                stream.add_listener(stream_id, listener)
+                self.dict_streams[stream_id] = stream
+                log.info("open stream_id[{}] shared with stream_id[{}] listeners[{}] uri is [{}] type=[{}]".format(
+                    stream_id, stream.stream_id, len(stream.listeners), uri, stream_type))
+                return stream
+            stream = MediaFactory.create_media(stream_type, stream_id, uri, listener)
+            if stream is None:
+                log.error("open stream_id[{}] error total[{}] uri is [{}] type=[{}]".format(
+                    stream_id, len(self.dict_streams), uri, stream_type))
+                return None
+            stream.share_key = key
+            stream.set_output_caps(output_caps)
+            if segment is not None:
+                stream.set_segment(*segment)
+            self.dict_shared[key] = stream
+            self.dict_streams[stream_id] = stream
+        # 分段播放的预卷和seek可能耗时数秒，锁外启动，不阻塞其它流的打开和关闭
+        stream.launch()
         log.info("open stream_id[{}] success total[{}] uri is [{}] type=[{}]".format(
-            stream_id, len(self.dict_streams), uri, stream_type))
+            stream_id, len(self.dict_shared), uri, stream_type))
         return stream
 
     def close_stream(self, stream_id):
@@ -89,12 +120,28 @@ class MediaManager:
        -------
        无
        """
-        stream = self.dict_streams.pop(stream_id)
-        if stream is None:
-            log.error("close stream_id[%s] failed total[%d]" % (stream_id, len(self.dict_streams)))
-        else:
+        with self.streams_mutex:
+            stream = self.dict_streams.pop(stream_id, None)
+            if stream is None:
+                log.error("close stream_id[%s] failed total[%d]" % (stream_id, len(self.dict_shared)))
+                return
+            remain = stream.remove_listener(stream_id)
+            if remain > 0:
+                log.info("close stream_id[%s] shared stream still has listeners[%d]" % (stream_id, remain))
+                return
+            # 最后一个listener关闭时才停止pipeline
+            if self.dict_shared.get(stream.share_key) is stream:
+                self.dict_shared.pop(stream.share_key)
             stream.stop()
-            log.info("close stream_id[%s] success total[%d]" % (stream_id, len(self.dict_streams)))
+        log.info("close stream_id[%s] success total[%d]" % (stream_id, len(self.dict_shared)))
+
+    def get_stats(self):
+        """ 各路流的订阅情况和解码统计 """
+        with self.streams_mutex:
+            streams = list(self.dict_shared.values())
+        return {stream.stream_id: {"uri": stream.uri, "listeners": list(stream.listeners.keys()),
+                                   "output_caps": stream.output_caps.to_dict(), "stats": stream.get_stats()}
+                for stream in streams}
 
 
 media_manager = MediaManager()
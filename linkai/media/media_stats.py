@@ -0,0 +1,77 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import threading
+
+# 平滑系数，延时统计使用指数滑动平均
+EWMA_ALPHA = 0.1
+
+
+class MediaStats(object):
+    """
+    单路流的解码统计
+
+    Attributes:
+        decoded: 解码输出的帧数
+        delivered: 送到appsink回调的帧数
+        decode_skipped: 关键帧模式下在解码器之前丢弃的非关键帧数
+        pts_lag_ms: 帧的pts对应的运行时间落后于pipeline时钟的时长(滑动平均)
+        max_pts_lag_ms: pts_lag_ms的最大值
+        reconnects: 断线重连次数
+        first_frame_ms: 最近一次开始播放或重连到收到首帧的耗时
+        max_first_frame_ms: first_frame_ms的最大值
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self.decoded = 0
+        self.delivered = 0
+        self.decode_skipped = 0
+        self.pts_lag_ms = 0.0
+        self.max_pts_lag_ms = 0.0
+        self.reconnects = 0
+        self.first_frame_ms = 0.0
+        self.max_first_frame_ms = 0.0
+
+    def incr(self, name, value=1):
+        with self._mutex:
+            setattr(self, name, getattr(self, name) + value)
+
+    def on_delivered(self, pts_lag_ms=None):
+        with self._mutex:
+            self.delivered += 1
+            if pts_lag_ms is None:
+                return
+            if self.pts_lag_ms == 0.0:
+                self.pts_lag_ms = pts_lag_ms
+            else:
+                self.pts_lag_ms += EWMA_ALPHA * (pts_lag_ms - self.pts_lag_ms)
+            self.max_pts_lag_ms = max(self.max_pts_lag_ms, pts_lag_ms)
+
+    def on_first_frame(self, first_frame_ms):
+        with self._mutex:
+            self.first_frame_ms = first_frame_ms
+            self.max_first_frame_ms = max(self.max_first_frame_ms, first_frame_ms)
+
+    def to_dict(self):
+        with self._mutex:
+            stats = {key: value for key, value in self.__dict__.items() if not key.startswith("_")}
+        # 解码后没有送到回调的帧即为延时策略丢弃的帧，包含极少量还在pipeline中的帧
+        stats["dropped"] = max(0, stats["decoded"] - stats["delivered"])
+        return stats
@@ -0,0 +1,160 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+# 支持的输出像素格式及每像素字节数，NV12为平面格式，按Y平面计算行数
+PIXEL_BYTES = {"RGBA": 4, "BGRA": 4, "RGB": 3, "BGR": 3, "NV12": 1}
+
+DEFAULT_FORMAT = "RGBA"
+
+
+class DecodeMode(object):
+    """
+    解码模式，低频分析的任务不需要解码每一帧
+    """
+    # 解码所有帧
+    ALL = "all"
+    # 只解码关键帧，非关键帧在进入解码器之前丢弃
+    KEYFRAME = "keyframe"
+    # 跳过B帧(不被参考的帧)，通过avdec的skip-frame属性
+    SKIP_B = "skip_b"
+
+    MODES = (ALL, KEYFRAME, SKIP_B)
+
+
+def frame_rows(format_type, height):
+    """ 一帧数据按行存储时的行数 """
+    if format_type == "NV12":
+        return height * 3 // 2
+    return height
+
+
+def frame_shape(format_type, height, width):
+    """ 帧在帧环中的形状，RGBA类保持原来的(1, h, w, 4)，RGB类为(h, w, 3)，NV12为(h*3/2, w) """
+    if format_type == "NV12":
+        return frame_rows(format_type, height), width
+    channels = PIXEL_BYTES.get(format_type, 4)
+    if channels == 4:
+        return 1, height, width, channels
+    return height, width, channels
+
+
+class LatencyPolicy(object):
+    """
+    回调处理不过来时的延时策略
+    """
+    # appsink只保留最新一帧，旧帧直接丢弃，解码不会被回调阻塞
+    DROP_OLDEST = "drop_oldest"
+    # appsink满时阻塞上游，不丢帧，延时会累积
+    BLOCK = "block"
+    # 解码后的队列满时丢弃旧帧，被丢弃的帧不做颜色转换和缩放
+    LEAKY_QUEUE = "leaky_queue"
+
+    POLICIES = (DROP_OLDEST, BLOCK, LEAKY_QUEUE)
+
+
+class AcquireMode(object):
+    """
+    取帧方式
+    """
+    # appsink的new-sample回调在gstreamer线程中拷贝每一帧并通知任务
+    PUSH = "push"
+    # 任务线程需要时用try-pull-sample取最新一帧，不需要的帧不会被映射和拷贝
+    PULL = "pull"
+
+    MODES = (PUSH, PULL)
+
+
+class OutputCaps(object):
+    """ 解码输出规格，由pipeline内的videoscale和videoconvert完成缩放和颜色转换
+
+    Attributes:
+        width: 输出宽度，0表示保持原始宽度
+        height: 输出高度，0表示保持原始高度，只指定一边时按原始比例缩放
+        format_type: 输出像素格式，见PIXEL_BYTES
+        decode_mode: 解码模式，见DecodeMode
+        latency_policy: 延时策略，见LatencyPolicy
+        acquire_mode: 取帧方式，见AcquireMode
+        replay: 离线回放，appsink不按时钟同步且不丢帧，按解码速度运行
+    """
+
+    def __init__(self, width=0, height=0, format_type=DEFAULT_FORMAT, decode_mode=DecodeMode.ALL,
+                 latency_policy=LatencyPolicy.DROP_OLDEST, acquire_mode=AcquireMode.PUSH, replay=False):
+        self.width = max(0, int(width))
+        self.height = max(0, int(height))
+        self.format_type = format_type if format_type in PIXEL_BYTES else DEFAULT_FORMAT
+        self.decode_mode = decode_mode if decode_mode in DecodeMode.MODES else DecodeMode.ALL
+        self.latency_policy = latency_policy if latency_policy in LatencyPolicy.POLICIES \
+            else LatencyPolicy.DROP_OLDEST
+        self.acquire_mode = acquire_mode if acquire_mode in AcquireMode.MODES else AcquireMode.PUSH
+        self.replay = bool(replay)
+        if self.replay:
+            # 回放由任务线程逐帧拉取，拉走之前阻塞解码
+            self.latency_policy = LatencyPolicy.BLOCK
+            self.acquire_mode = AcquireMode.PULL
+
+    @staticmethod
+    def from_param(algo_param, algo_info=None, latency_policy=LatencyPolicy.DROP_OLDEST,
+                   acquire_mode=AcquireMode.PUSH):
+        """ 任务参数outputWidth/outputHeight/outputFormat优先，其次是算法register()中声明的
+        input_width/input_height/input_format。decodeMode没有配置时，只采样关键帧的任务只解码关键帧,
+        latencyPolicy、acquireMode没有配置时使用latency_policy、acquire_mode，replay为true时是离线回放 """
+        algo_info = algo_info or {}
+        try:
+            width = int(algo_param.get("outputWidth", algo_info.get("input_width", 0)))
+            height = int(algo_param.get("outputHeight", algo_info.get("input_height", 0)))
+        except (TypeError, ValueError):
+            width, height = 0, 0
+        format_type = str(algo_param.get("outputFormat", algo_info.get("input_format", DEFAULT_FORMAT))).upper()
+        default_mode = DecodeMode.KEYFRAME if algo_param.get("sampleKeyframeOnly") else DecodeMode.ALL
+        decode_mode = str(algo_param.get("decodeMode", default_mode)).lower()
+        latency_policy = str(algo_param.get("latencyPolicy", latency_policy)).lower()
+        acquire_mode = str(algo_param.get("acquireMode", acquire_mode)).lower()
+        return OutputCaps(width, height, format_type, decode_mode, latency_policy, acquire_mode,
+                          bool(algo_param.get("replay")))
+
+    def is_scaled(self):
+        return self.width > 0 or self.height > 0
+
+    def is_pull(self):
+        return self.acquire_mode == AcquireMode.PULL
+
+    def to_caps_string(self, memory=None):
+        """ appsink的caps字符串，memory为None时是系统内存，例如"NVMM" """
+        media_type = "video/x-raw" if memory is None else "video/x-raw(memory:{})".format(memory)
+        caps = "{}, format=(string){}".format(media_type, self.format_type)
+        if self.width > 0:
+            caps += ", width=(int){}".format(self.width)
+        if self.height > 0:
+            caps += ", height=(int){}".format(self.height)
+        return caps
+
+    def key(self):
+        return self.width, self.height, self.format_type, self.decode_mode, self.latency_policy, self.acquire_mode, \
+            self.replay
+
+    def __eq__(self, other):
+        return isinstance(other, OutputCaps) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def to_dict(self):
+        return {"width": self.width, "height": self.height, "format": self.format_type,
+                "decode_mode": self.decode_mode, "latency_policy": self.latency_policy,
+                "acquire_mode": self.acquire_mode, "replay": self.replay}
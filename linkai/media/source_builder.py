@@ -0,0 +1,248 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+from urllib.parse import urlsplit
+import threading
+import logging
+import time
+import os
+
+import gi
+from linkai import conf
+from .uri import normalize_uri
+
+gi.require_version('Gst', '1.0')
+gi.require_version('GstPbutils', '1.0')
+
+from gi.repository import Gst, GstPbutils
+
+log = logging.getLogger(__name__)
+
+# 视频编码 -> (解析器, cpu解码器, gpu解码器, rtp解包器)
+CODECS = {
+    "h264": ("h264parse", "avdec_h264", "nvdec_h264", "rtph264depay"),
+    "h265": ("h265parse", "avdec_h265", "nvdec_h265", "rtph265depay"),
+    # mjpeg在gpu模式下也用jpegdec解码，nvvidconv负责上传显存
+    "mjpeg": ("jpegparse", "jpegdec", "jpegdec", "rtpjpegdepay"),
+}
+# 探测到的caps名 -> 视频编码
+CAPS_CODECS = {"video/x-h264": "h264", "video/x-h265": "h265", "image/jpeg": "mjpeg"}
+
+# rtspsrc的protocols属性(GstRTSPLowerTrans)
+RTSP_TRANSPORTS = {"udp": 1, "udp_mcast": 2, "tcp": 4, "auto": 7}
+RTSP_TRANSPORT = conf.get_string("Media", "rtsp_transport")
+RTSP_LATENCY = conf.get_int("Media", "rtsp_latency")
+# 编码探测超时(秒)
+PROBE_TIMEOUT = conf.get_int("Media", "probe_timeout")
+# 探测失败的结果缓存时间(秒)，期间重新打开不再探测
+PROBE_FAILURE_TTL = conf.get_int("Media", "probe_failure_ttl")
+# 解封装和解析之间的队列长度
+QUEUE_MAX_BUFFERS = 5
+
+# 本地文件和http扩展名 -> 解封装器
+FILE_DEMUXERS = {
+    ".mp4": "qtdemux", ".m4v": "qtdemux", ".mov": "qtdemux",
+    ".avi": "avidemux",
+    ".ts": "tsdemux",
+    ".mkv": "matroskademux", ".webm": "matroskademux",
+    ".flv": "flvdemux",
+}
+
+
+class SourceStage(object):
+    """ 源链路中的一级
+
+    Attributes:
+        factory: gst element工厂名
+        props: element属性
+        dynamic: 输出pad是否动态创建，是则在pad-added中连接下一级
+    """
+
+    def __init__(self, factory, props=None, dynamic=False):
+        self.factory = factory
+        self.props = props or {}
+        self.dynamic = dynamic
+
+
+class ProbeResult(object):
+    """ 探测结果
+
+    Attributes:
+        codec: 视频编码，见CODECS，探测失败或不支持时为None
+        duration: 时长(纳秒)，直播流或无法获取时为0
+    """
+
+    def __init__(self, codec, duration=0):
+        self.codec = codec
+        self.duration = duration
+
+
+class SourceBuilder(object):
+    """ 按uri组装 源 -> 解封装/解包 -> 队列 -> 解析 -> 解码 的链路，单件实例source_builder
+
+    各协议和封装格式通过register注册，Media的各个子类共用。视频编码通过GstPbutils.Discoverer探测,
+    编码和时长按归一化uri缓存，重新打开同一路流时不再探测，探测失败的结果缓存probe_failure_ttl秒。
+    探测可能要连接摄像头并预卷，耗时最长probe_timeout秒，MediaManager在加锁之前调用probe预先探测
+    Attributes:
+        builders: [(match(uri, ext), build(uri, codec))]，按注册顺序匹配，build返回SourceStage列表
+    """
+
+    def __init__(self):
+        self.builders = []
+        self._probed = {}
+        self._mutex = threading.Lock()
+
+    def register(self, match, build):
+        self.builders.append((match, build))
+
+    @staticmethod
+    def extension(uri):
+        return os.path.splitext(urlsplit(uri).path if "://" in uri else uri)[1].lower()
+
+    def find(self, uri):
+        ext = self.extension(uri)
+        for match, build in self.builders:
+            if match(uri, ext):
+                return build
+        return None
+
+    def probe(self, uri):
+        """ 探测视频编码和时长，成功的结果一直缓存，失败的结果缓存probe_failure_ttl秒 """
+        key = normalize_uri(uri)
+        with self._mutex:
+            cached = self._probed.get(key)
+        if cached is not None:
+            result, expire_time = cached
+            if expire_time is None or time.monotonic() < expire_time:
+                return result
+        discover_uri = uri if Gst.uri_is_valid(uri) else Gst.filename_to_uri(uri)
+        codec, duration = None, 0
+        try:
+            discoverer = GstPbutils.Discoverer.new(PROBE_TIMEOUT * Gst.SECOND)
+            info = discoverer.discover_uri(discover_uri)
+            streams = info.get_video_streams()
+            name = streams[0].get_caps().get_structure(0).get_name() if streams else None
+            duration = info.get_duration()
+            codec = CAPS_CODECS.get(name)
+            if codec is None:
+                log.warning("probe uri={} unsupport caps={}".format(uri, name))
+        except Exception as e:
+            log.warning("probe uri={} failed, error={}".format(uri, e))
+        if duration is None or duration == Gst.CLOCK_TIME_NONE:
+            duration = 0
+        if codec is None:
+            result, expire_time = ProbeResult(None, duration), time.monotonic() + PROBE_FAILURE_TTL
+        else:
+            log.info("probe uri={} codec={} duration={}".format(uri, codec, duration))
+            result, expire_time = ProbeResult(codec, duration), None
+        with self._mutex:
+            self._probed[key] = (result, expire_time)
+        return result
+
+    def prepare(self, uri):
+        """ uri由本构建器处理时预先探测，调用方不持有任何锁 """
+        if self.find(uri) is not None:
+            self.probe(uri)
+
+    def build(self, pipeline, uri, on_pad_added, gpu=False):
+        """ 把源链路加入pipeline，返回末端的解码器，uri不支持、编码探测失败或缺少插件时返回None且不改动pipeline,
+        调用方退回uridecodebin自动协商编码
+
+        参数
+        ----------
+        on_pad_added : function
+            动态pad的连接回调，签名为on_pad_added(element, pad, next_element)
+        gpu : bool
+            使用gpu解码器
+        """
+        build = self.find(uri)
+        if build is None:
+            return None
+        codec = self.probe(uri).codec
+        if codec is None:
+            # 固定的解码链路一旦选错，重连复用pipeline也无法恢复
+            log.warning("build source uri={} codec unknown, fallback".format(uri))
+            return None
+        parse, cpu_decoder, gpu_decoder, depay = CODECS[codec]
+        stages = build(uri, codec) + [SourceStage("queue2", {"max-size-buffers": QUEUE_MAX_BUFFERS}),
+                                      SourceStage(parse), SourceStage(gpu_decoder if gpu else cpu_decoder)]
+        elements = []
+        for stage in stages:
+            element = Gst.ElementFactory.make(stage.factory, None)
+            if element is None:
+                log.error("build source uri={} element={} not found".format(uri, stage.factory))
+                return None
+            for name, value in stage.props.items():
+                element.set_property(name, value)
+            elements.append(element)
+        # 解析器定期插入sps/pps，重连或中途加入时可以尽快解码
+        if elements[-2].find_property("config-interval") is not None:
+            elements[-2].set_property("config-interval", 1)
+        for element in elements:
+            pipeline.add(element)
+        for i in range(len(stages) - 1):
+            if stages[i].dynamic:
+                elements[i].connect("pad-added", on_pad_added, elements[i + 1])
+            else:
+                elements[i].link(elements[i + 1])
+        log.info("build source uri={} chain={}".format(uri, " ! ".join(stage.factory for stage in stages)))
+        return elements[-1]
+
+
+def _location(uri):
+    return Gst.uri_get_location(uri) if uri.startswith("file://") else uri
+
+
+def _is_http(uri):
+    return uri.startswith("http://") or uri.startswith("https://")
+
+
+def _build_rtmp(uri, codec):
+    return [SourceStage("rtmpsrc", {"location": uri}), SourceStage("flvdemux", dynamic=True)]
+
+
+def _build_rtsp(uri, codec):
+    props = {"location": uri, "latency": RTSP_LATENCY,
+             "protocols": RTSP_TRANSPORTS.get(RTSP_TRANSPORT, RTSP_TRANSPORTS["tcp"])}
+    return [SourceStage("rtspsrc", props, dynamic=True), SourceStage(CODECS[codec][3])]
+
+
+def _build_hls(uri, codec):
+    return [SourceStage("souphttpsrc", {"location": uri}), SourceStage("hlsdemux", dynamic=True),
+            SourceStage("tsdemux", dynamic=True)]
+
+
+def _build_http(uri, codec):
+    # http-flv、http-ts等直播流
+    return [SourceStage("souphttpsrc", {"location": uri, "is-live": True}),
+            SourceStage(FILE_DEMUXERS[SourceBuilder.extension(uri)], dynamic=True)]
+
+
+def _build_file(uri, codec):
+    return [SourceStage("filesrc", {"location": _location(uri)}),
+            SourceStage(FILE_DEMUXERS[SourceBuilder.extension(uri)], dynamic=True)]
+
+
+source_builder = SourceBuilder()
+source_builder.register(lambda uri, ext: uri.startswith("rtmp://"), _build_rtmp)
+source_builder.register(lambda uri, ext: uri.startswith("rtsp://") or uri.startswith("rtsps://"), _build_rtsp)
+source_builder.register(lambda uri, ext: _is_http(uri) and ext == ".m3u8", _build_hls)
+source_builder.register(lambda uri, ext: _is_http(uri) and ext in FILE_DEMUXERS, _build_http)
+source_builder.register(lambda uri, ext: ("://" not in uri or uri.startswith("file://")) and ext in FILE_DEMUXERS,
+                        _build_file)
@@ -0,0 +1,51 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+from urllib.parse import urlsplit, urlunsplit
+import os
+
+
+def normalize_uri(uri):
+    """ 归一化流媒体uri，用于判断两个任务是否拉的是同一路流
+
+    本地文件转换为绝对路径的file://uri，协议和主机名转为小写，去掉首尾空白和路径末尾的/，
+    用户名密码、路径和参数保持原样
+    """
+    uri = uri.strip()
+    if "://" not in uri:
+        if uri == "local":
+            return uri
+        return "file://" + os.path.abspath(uri)
+    parts = urlsplit(uri)
+    netloc = parts.netloc
+    if "@" in netloc:
+        userinfo, host = netloc.rsplit("@", 1)
+        netloc = userinfo + "@" + host.lower()
+    else:
+        netloc = netloc.lower()
+    path = parts.path
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+    return urlunsplit((parts.scheme.lower(), netloc, path, parts.query, parts.fragment))
+
+
+def is_file_uri(uri):
+    """ 本地文件，包括不带协议的路径和file://uri """
+    uri = uri.strip()
+    return ("://" not in uri and uri != "local") or uri.lower().startswith("file://")
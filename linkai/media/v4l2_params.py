@@ -0,0 +1,106 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+from urllib.parse import urlsplit, parse_qs
+from fractions import Fraction
+import logging
+
+from linkai import conf
+
+log = logging.getLogger(__name__)
+
+# v4l2src的io-mode属性取值
+IO_MODES = {"auto": 0, "rw": 1, "mmap": 2, "userptr": 3, "dmabuf": 4, "dmabuf-import": 5}
+# uri中的format -> gstreamer raw格式名，mjpeg单独处理
+RAW_FORMATS = {"yuyv": "YUY2", "yuy2": "YUY2", "uyvy": "UYVY", "nv12": "NV12", "i420": "I420", "gray": "GRAY8"}
+MJPEG = "mjpeg"
+# 测试源，用videotestsrc模拟摄像头，不需要真实设备
+TEST_SOURCE = "videotestsrc"
+
+
+class V4L2Params(object):
+    """ v4l2采集参数，从uri解析
+
+    uri格式: v4l2:///dev/video2?width=1280&height=720&fps=15&format=mjpeg&io_mode=mmap,
+    "local"等同于不带参数的v4l2uri。source=videotestsrc时用测试源按相同的caps模拟摄像头
+    Attributes:
+        device: 设备路径
+        width/height: 采集分辨率，0表示由摄像头决定
+        fps: 采集帧率，0表示由摄像头决定
+        format: mjpeg或raw格式(yuyv、nv12等)，空表示由摄像头决定
+        io_mode: v4l2src的io-mode，见IO_MODES
+        source: v4l2src或videotestsrc
+    """
+
+    def __init__(self, device, width=0, height=0, fps=0.0, format_type="", io_mode="auto", source="v4l2src"):
+        self.device = device
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.format = format_type
+        self.io_mode = io_mode if io_mode in IO_MODES else "auto"
+        self.source = source
+
+    @staticmethod
+    def from_uri(uri):
+        device = conf.get_string("V4L2", "device")
+        io_mode = conf.get_string("V4L2", "io_mode")
+        if not uri.lower().startswith("v4l2://"):
+            return V4L2Params(device, io_mode=io_mode)
+        parts = urlsplit(uri)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        try:
+            width = int(query.get("width", 0))
+            height = int(query.get("height", 0))
+            fps = float(query.get("fps", 0))
+        except ValueError as e:
+            log.error("v4l2 uri={} param error={}".format(uri, e))
+            width, height, fps = 0, 0, 0.0
+        return V4L2Params(parts.path or device, width, height, fps, query.get("format", "").lower(),
+                          query.get("io_mode", io_mode).lower(), query.get("source", "v4l2src").lower())
+
+    def is_mjpeg(self):
+        return self.format == MJPEG
+
+    def is_test(self):
+        return self.source == TEST_SOURCE
+
+    def to_caps_string(self, encoded=True):
+        """ 采集端的caps，限定摄像头输出的格式、分辨率和帧率，没有限定时返回None。
+        encoded为False时mjpeg也返回raw caps，测试源先出raw再编码成jpeg """
+        if self.is_mjpeg() and encoded:
+            caps = "image/jpeg"
+        elif self.format and not self.is_mjpeg():
+            caps = "video/x-raw, format=(string){}".format(RAW_FORMATS.get(self.format, self.format.upper()))
+        else:
+            caps = "video/x-raw"
+        if self.width > 0:
+            caps += ", width=(int){}".format(self.width)
+        if self.height > 0:
+            caps += ", height=(int){}".format(self.height)
+        if self.fps > 0:
+            fraction = Fraction(self.fps).limit_denominator(1001)
+            caps += ", framerate=(fraction){}/{}".format(fraction.numerator, fraction.denominator)
+        if caps == "video/x-raw":
+            return None
+        return caps
+
+    def to_dict(self):
+        return {"device": self.device, "width": self.width, "height": self.height, "fps": self.fps,
+                "format": self.format, "io_mode": self.io_mode, "source": self.source}
@@ -18,7 +18,6 @@
 #
 
 import logging
-import os
 
 from linkai import conf
 import oss2
@@ -35,22 +34,10 @@ class OssClient(object):
     """
 
     def __init__(self):
-        if "ACCESS_KEY_ID" in os.environ:
-            self.access_key_id = os.environ["ACCESS_KEY_ID"]
-        else:
-            self.access_key_id = conf.get_string("OSS_CFG", "access_key_id")
-        if "ACCESS_KEY_SECRET" in os.environ:
-            self.access_key_secret = os.environ["ACCESS_KEY_SECRET"]
-        else:
-            self.access_key_secret = conf.get_string("OSS_CFG", "access_key_secret")
-        if "BUCKET_NAME" in os.environ:
-            self.bucket_name = os.environ["BUCKET_NAME"]
-        else:
-            self.bucket_name = conf.get_string("OSS_CFG", "bucket_name")
-        if "ENDPOINT" in os.environ:
-            self.endpoint = os.environ["ENDPOINT"]
-        else:
-            self.endpoint = conf.get_string("OSS_CFG", "endpoint")
+        self.access_key_id = conf.get_string("OSS_CFG", "access_key_id")
+        self.access_key_secret = conf.get_string("OSS_CFG", "access_key_secret")
+        self.bucket_name = conf.get_string("OSS_CFG", "bucket_name")
+        self.endpoint = conf.get_string("OSS_CFG", "endpoint")
         self.bucket = oss2.Bucket(oss2.Auth(self.access_key_id, self.access_key_secret), self.endpoint,
                                   self.bucket_name)
         return
@@ -63,8 +50,10 @@ class OssClient(object):
             self.bucket.put_object(key=oss_filename, data=img_buffer,
                                    headers=headers)
             log.debug("oss put_object_from_buffer file={} ok".format(oss_filename))
+            return True
         except Exception as e:
             log.error("oss put_object_from_buffer file={} failed, error={}".format(oss_filename, e))
+            return False
 
     def put_object_from_file(self, oss_filename, local_filename):
         try:
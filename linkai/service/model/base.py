@@ -32,7 +32,11 @@ class BaseRequest(object):
         """
         for key, value in dct.items():
             if isinstance(value, dict):
-                sub_obj = getattr(obj_tag, key)
+                sub_obj = getattr(obj_tag, key, None)
+                if not hasattr(sub_obj, "__dict__"):
+                    # 字段默认值不是对象(例如algoParam)时直接保存字典
+                    setattr(obj_tag, key, value)
+                    continue
                 sub_dct = dct[key]
                 if sub_dct is not None:
                     self.dict2obj(sub_dct, sub_obj)
@@ -0,0 +1,100 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+from .base import BaseResponse, BaseRequest
+from .start_algorithm import StartAlgorithmRequest
+from .update_algorithm import UpdateAlgorithmRequest
+from .iotx_codes import *
+
+
+def to_request(item, request_class):
+    """ 批量请求中的一项转换为单个请求对象，不是对象的项返回None """
+    if not isinstance(item, dict):
+        return None
+    req = request_class()
+    return req.dict2obj(item, req)
+
+
+class BatchStartAlgorithmRequest(BaseRequest):
+    """ 批量开启算法任务
+    批量开启算法任务接口，请求，taskList中每一项和StartAlgorithmRequest一致
+    """
+
+    def __init__(self):
+        self.taskList = []
+
+    def check_params(self):
+        return isinstance(self.taskList, list) and len(self.taskList) > 0
+
+    def get_requests(self):
+        return [to_request(item, StartAlgorithmRequest) for item in self.taskList]
+
+
+class BatchStopAlgorithmRequest(BaseRequest):
+    """ 批量停止算法任务
+    批量停止算法任务接口，请求
+    """
+
+    def __init__(self):
+        self.taskIdList = []
+
+    def check_params(self):
+        # taskId必须是字符串，json中的对象或数组不能作为任务字典的key
+        return isinstance(self.taskIdList, list) and len(self.taskIdList) > 0 and \
+            all(isinstance(task_id, str) for task_id in self.taskIdList)
+
+
+class BatchUpdateAlgorithmRequest(BaseRequest):
+    """ 批量更新算法任务参数
+    批量更新算法任务参数接口，请求，taskList中每一项和UpdateAlgorithmRequest一致
+    """
+
+    def __init__(self):
+        self.taskList = []
+
+    def check_params(self):
+        return isinstance(self.taskList, list) and len(self.taskList) > 0
+
+    def get_requests(self):
+        return [to_request(item, UpdateAlgorithmRequest) for item in self.taskList]
+
+
+class BatchItemResult(object):
+    """
+    批量接口中单个任务的处理结果
+
+    """
+
+    def __init__(self, task_id, iotx_code: 'IoTxCode' = IoTxCodes.SUCCESS):
+        self.taskId = task_id
+        self.result = iotx_code.code
+        self.message = iotx_code.message
+
+
+class BatchAlgorithmResponse(BaseResponse):
+    """ 批量开启/停止/更新算法任务
+       批量接口，回复，resultList和请求中的任务一一对应
+       """
+
+    def __init__(self, iotx_code: 'IoTxCode' = IoTxCodes.SUCCESS):
+        BaseResponse.__init__(self, iotx_code)
+        self.resultList = []
+
+    def append(self, item: "BatchItemResult"):
+        self.resultList.append(item)
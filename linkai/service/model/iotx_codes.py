@@ -46,6 +46,9 @@ class IoTxCodes(object):
     # 设备异常
     DEVICE_EXCEPTION = IoTxCode(3, "device exception")
 
+    # 任务号已存在
+    TASK_ID_EXIST = IoTxCode(4, "task id exist")
+
     # 停止任务接口
     # 任务号错误
     NOT_FIND_TASK_ID = IoTxCode(1, "not find task id")
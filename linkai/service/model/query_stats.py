@@ -0,0 +1,31 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+from .base import BaseResponse, BaseRequest
+from .iotx_codes import *
+
+
+class QueryStatsResponse(BaseResponse):
+    """ 查询运行统计
+       查询运行统计接口，回复
+       """
+
+    def __init__(self, iotx_code: 'IoTxCode' = IoTxCodes.SUCCESS, stats=None):
+        BaseResponse.__init__(self, iotx_code)
+        self.stats = stats
@@ -36,7 +36,7 @@ class TaskDTO(object):
 
       """
 
-    def __init__(self, task_id, device_id, video_url, algo_name, record, status, algo_param):
+    def __init__(self, task_id, device_id, video_url, algo_name, record, status, algo_param, stats=None):
         self.taskId = task_id
         self.deviceId = device_id
         self.videoUrl = video_url
@@ -44,6 +44,7 @@ class TaskDTO(object):
         self.record = record
         self.status = status
         self.algoParam = algo_param
+        self.stats = stats
 
 
 class QueryTaskResponse(BaseResponse):
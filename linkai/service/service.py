@@ -25,10 +25,17 @@ from linkai.algostore import algo_manager
 from linkai.utils import image
 from linkai.task.model.task_param import TaskParamTO
 from linkai.task.manager import task_manager
+from linkai.task.post_process import post_process_pipeline
+from linkai.snapshot.store import snapshot_store
+from linkai.task.registry import task_registry
+from linkai.media.manager import media_manager
 from linkai.algo_result import *
 from .model.start_algorithm import StartAlgorithmRequest, StartAlgorithmResponse
 from .model.stop_algorithm import StopAlgorithmResponse, StopAlgorithmRequest
+from .model.batch_algorithm import BatchStartAlgorithmRequest, BatchStopAlgorithmRequest, \
+    BatchUpdateAlgorithmRequest, BatchAlgorithmResponse, BatchItemResult
 from .model.inference_image import InferenceRequest, InferenceResponse
+from .model.query_stats import QueryStatsResponse
 from .model.base import BaseResponse
 from .model.iotx_codes import IoTxCodes
 
@@ -126,6 +133,90 @@ def handle_stop_algorithm():
     return StopAlgorithmResponse(IoTxCodes.SUCCESS)
 
 
+@app.route('/vision/edge/aibiz/algorithm/batchStart', methods=['POST'])
+def handle_batch_start_algorithm():
+    """
+    批量开启算法任务，逐项校验后一次提交给任务管理并行启动
+    :return:BatchAlgorithmResponse
+    """
+    req = BatchStartAlgorithmRequest().init_from_json(request.get_data())
+    if not req.check_params():
+        return BatchAlgorithmResponse(IoTxCodes.REQUEST_PARAM_ERROR)
+    resp = BatchAlgorithmResponse(IoTxCodes.SUCCESS)
+    dict_algo_supported = {}
+    list_task_param = []
+    list_index = []
+    set_task_id = set()
+    for item in req.get_requests():
+        task_id = None if item is None else item.taskId
+        if item is None or not item.check_params():
+            resp.append(BatchItemResult(task_id, IoTxCodes.REQUEST_PARAM_ERROR))
+            continue
+        if item.algorithm not in dict_algo_supported:
+            dict_algo_supported[item.algorithm] = algo_manager.check_algorithm(item.algorithm)
+        if not dict_algo_supported[item.algorithm]:
+            resp.append(BatchItemResult(task_id, IoTxCodes.ALGORITHM_NOT_SUPPORT))
+            continue
+        if task_id is None:
+            task_id = uuid.uuid4().hex
+        if task_id in set_task_id:
+            resp.append(BatchItemResult(task_id, IoTxCodes.TASK_ID_EXIST))
+            continue
+        set_task_id.add(task_id)
+        list_index.append(len(resp.resultList))
+        resp.append(BatchItemResult(task_id, IoTxCodes.SUCCESS))
+        list_task_param.append(TaskParamTO(task_id, item.deviceId, item.videoUrl, item.algorithm, item.algoParam))
+
+    results = task_manager.start_algo_tasks(list_task_param)
+    for index, ret in zip(list_index, results):
+        if not ret:
+            resp.resultList[index] = BatchItemResult(resp.resultList[index].taskId, IoTxCodes.TASK_ID_EXIST)
+    return resp
+
+
+@app.route('/vision/edge/aibiz/algorithm/batchStop', methods=['POST'])
+def handle_batch_stop_algorithm():
+    """
+    批量停止算法任务
+    :return:BatchAlgorithmResponse
+    """
+    req = BatchStopAlgorithmRequest().init_from_json(request.get_data())
+    if not req.check_params():
+        return BatchAlgorithmResponse(IoTxCodes.REQUEST_PARAM_ERROR)
+    resp = BatchAlgorithmResponse(IoTxCodes.SUCCESS)
+    results = task_manager.stop_algo_tasks(req.taskIdList)
+    for task_id, ret in zip(req.taskIdList, results):
+        resp.append(BatchItemResult(task_id, IoTxCodes.SUCCESS if ret else IoTxCodes.NOT_FIND_TASK_ID))
+    return resp
+
+
+@app.route('/vision/edge/aibiz/algorithm/batchUpdate', methods=['POST'])
+def handle_batch_update_algorithm():
+    """
+    批量更新算法任务参数
+    :return:BatchAlgorithmResponse
+    """
+    req = BatchUpdateAlgorithmRequest().init_from_json(request.get_data())
+    if not req.check_params():
+        return BatchAlgorithmResponse(IoTxCodes.REQUEST_PARAM_ERROR)
+    resp = BatchAlgorithmResponse(IoTxCodes.SUCCESS)
+    list_task_param = []
+    list_index = []
+    for item in req.get_requests():
+        if item is None or not item.check_params():
+            resp.append(BatchItemResult(None if item is None else item.taskId, IoTxCodes.REQUEST_PARAM_ERROR))
+            continue
+        list_index.append(len(resp.resultList))
+        resp.append(BatchItemResult(item.taskId, IoTxCodes.SUCCESS))
+        list_task_param.append((item.taskId, item.algoParam))
+
+    results = task_manager.update_algo_tasks(list_task_param)
+    for index, ret in zip(list_index, results):
+        if not ret:
+            resp.resultList[index] = BatchItemResult(resp.resultList[index].taskId, IoTxCodes.NOT_FIND_TASK_ID)
+    return resp
+
+
 @app.route('/vision/edge/aibiz/algorithm/queryTask', methods=['POST'])
 def handle_query_all_task():
     """
@@ -140,19 +231,57 @@ def handle_query_all_task():
         if task_bean is not None:
             task_dto = TaskDTO(req.taskId, task_bean.get_device_id(), task_bean.get_video_url(),
                                task_bean.get_algo_name(),
-                               task_bean.get_record(), task_bean.get_status().value, task_bean.get_algo_param())
+                               task_bean.get_record(), task_bean.get_status().value, task_bean.get_algo_param(),
+                               task_bean.get_stats())
             resp.append(task_dto)
     else:
         src_tasks = task_manager.get_all_algo_tasks()
         for taskId, task_bean in src_tasks.items():
             task_dto = TaskDTO(taskId, task_bean.get_device_id(), task_bean.get_video_url(),
                                task_bean.get_algo_name(),
-                               task_bean.get_record(), task_bean.get_status().value, task_bean.get_algo_param())
+                               task_bean.get_record(), task_bean.get_status().value, task_bean.get_algo_param(),
+                               task_bean.get_stats())
             resp.append(task_dto)
 
     return resp
 
 
+@app.route('/vision/edge/aibiz/stats/postProcess', methods=['POST'])
+def handle_query_post_process_stats():
+    """
+    查询报警后处理流水线各级统计
+    :return:QueryStatsResponse
+    """
+    return QueryStatsResponse(IoTxCodes.SUCCESS, post_process_pipeline.get_stats())
+
+
+@app.route('/vision/edge/aibiz/stats/snapshot', methods=['POST'])
+def handle_query_snapshot_stats():
+    """
+    查询本地抓拍图片存储统计
+    :return:QueryStatsResponse
+    """
+    return QueryStatsResponse(IoTxCodes.SUCCESS, snapshot_store.get_stats())
+
+
+@app.route('/vision/edge/aibiz/stats/media', methods=['POST'])
+def handle_query_media_stats():
+    """
+    查询各路流解码、送达、丢弃帧数和pts延时
+    :return:QueryStatsResponse
+    """
+    return QueryStatsResponse(IoTxCodes.SUCCESS, media_manager.get_stats())
+
+
+@app.route('/vision/edge/aibiz/stats/taskRegistry', methods=['POST'])
+def handle_query_task_registry_stats():
+    """
+    查询任务持久化登记统计
+    :return:QueryStatsResponse
+    """
+    return QueryStatsResponse(IoTxCodes.SUCCESS, task_registry.get_stats())
+
+
 @app.route('/vision/edge/aibiz/image/inference', methods=['POST'])
 def handle_inference_image():
     """
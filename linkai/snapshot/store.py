@@ -0,0 +1,128 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import collections
+import threading
+import itertools
+import logging
+import time
+import os
+
+from linkai import conf
+
+log = logging.getLogger(__name__)
+
+PIC_PATH = "static/images/"
+
+
+class SnapshotStore(object):
+    """ 本地抓拍图片存储，单件实例snapshot_store
+
+    按数量、总字节数、存活时间三种方式限制static/images目录，0表示不限制。
+    内存中按写入顺序维护索引，淘汰时直接从最老的一端删除，不扫描目录
+    Attributes:
+        path: 存储目录
+        max_count: 最多保留图片数
+        max_bytes: 最多占用字节数
+        max_age: 最长保留时间(秒)
+    """
+
+    def __init__(self, path=PIC_PATH):
+        self.path = path
+        self.max_count = conf.get_int("OSS_CFG", "max_pic_number")
+        self.max_bytes = conf.get_int("OSS_CFG", "max_pic_bytes")
+        self.max_age = conf.get_int("OSS_CFG", "max_pic_age")
+        self.total_bytes = 0
+        self.evicted = 0
+        # name -> (size, create_time)，按写入时间排序
+        self._index = collections.OrderedDict()
+        self._mutex = threading.Lock()
+        self._seq = itertools.count()
+        self._load()
+        if self.max_age > 0:
+            threading.Thread(target=self._age_loop, name="SnapshotEvict", daemon=True).start()
+
+    def _load(self):
+        """ 启动时扫描一次已有图片建立索引 """
+        os.makedirs(self.path, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for mtime, name, size in sorted(entries):
+            self._index[name] = (size, mtime)
+            self.total_bytes += size
+        with self._mutex:
+            self._evict()
+        log.info("snapshot store path={} count={} bytes={}".format(self.path, len(self._index), self.total_bytes))
+
+    def new_name(self, task_id):
+        """ 生成不重复的图片名，毫秒时间戳加进程内序号 """
+        now = time.time()
+        return "T{}_{}_{:03d}_{:06d}.jpg".format(task_id, time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime(now)),
+                                                 int((now - int(now)) * 1000), next(self._seq) % 1000000)
+
+    def save(self, name, data):
+        """ 保存图片并按配置淘汰最老的图片 """
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(data)
+        with self._mutex:
+            old = self._index.pop(name, None)
+            if old is not None:
+                self.total_bytes -= old[0]
+            self._index[name] = (len(data), time.time())
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _over_limit(self, now):
+        if self.max_count > 0 and len(self._index) > self.max_count:
+            return True
+        if self.max_bytes > 0 and self.total_bytes > self.max_bytes:
+            return True
+        if self.max_age > 0:
+            _, (_, create_time) = next(iter(self._index.items()))
+            return now - create_time > self.max_age
+        return False
+
+    def _evict(self):
+        now = time.time()
+        while self._index and self._over_limit(now):
+            name, (size, _) = self._index.popitem(last=False)
+            self.total_bytes -= size
+            self.evicted += 1
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError as e:
+                log.warning("snapshot evict file={} error={}".format(name, e))
+
+    def _age_loop(self):
+        """ 没有新图片写入时也按存活时间淘汰 """
+        while True:
+            time.sleep(min(60, self.max_age))
+            with self._mutex:
+                self._evict()
+
+    def get_stats(self):
+        with self._mutex:
+            return {"count": len(self._index), "bytes": self.total_bytes, "evicted": self.evicted,
+                    "max_count": self.max_count, "max_bytes": self.max_bytes, "max_age": self.max_age}
+
+
+snapshot_store = SnapshotStore()
@@ -21,19 +21,33 @@ import datetime, threading, logging, time
 import os
 from collections import deque
 from ffmpy import FFmpeg
+from linkai import conf
 from linkai.algostore import algo_manager
-from linkai.utils import tools
-from linkai.oss.client import oss_client
 from linkai.media.manager import media_manager
+from linkai.media.factory.media_factory import MediaFactory
+from linkai.media.output_caps import OutputCaps
+from linkai.media.uri import is_file_uri
+from linkai.media.source_builder import source_builder
+from linkai.snapshot.store import snapshot_store
 from linkai.algo_result import *
 from linkai.utils.algorithm_base import OSDBase, OSDType, Rect
 from .task import Task, PIC_PATH
+from ..sampling import SamplingPolicy
+from ..replay import ReplayManifest, ReplayChunk, CHUNK_WORKERS
+from ..post_process import PostProcessJob, post_process_pipeline
 from ..model.image_info import ImageInfo
-from ..model.task_param import TaskStatus, TaskParamTO
+from ..model.task_stats import TaskStats
+from ..model.task_param import TaskStatus, TaskParamTO, algo_param_to_dict
 
 log = logging.getLogger(__name__)
 
-time_interval = 1
+# 默认推理采样间隔(秒), algoParam没有配置采样策略时使用
+time_interval = conf.get_float("OSS_CFG", "time_interval")
+# 默认延时策略和取帧方式, algoParam的latencyPolicy、acquireMode可以按任务覆盖
+latency_policy = conf.get_string("Media", "latency_policy")
+acquire_mode = conf.get_string("Media", "acquire_mode")
+# 拉模式下等待新帧的最长时间，超时后重新检查任务状态
+PULL_TIMEOUT_MS = 100
 before_alarm_time = 10
 after_alarm_time = 10
 
@@ -42,10 +56,25 @@ class CommonTask(Task):
     def __init__(self, task_param: "TaskParamTO"):
         super(CommonTask, self).__init__(task_param)
         # 算法处理RGBA
-        self.mq_last_time = datetime.datetime.now()
+        self.sampling_policy = SamplingPolicy.from_algo_param(self.algo_param_dict(), time_interval)
         self.image_info = None
+        self._media = None
+        self._output_caps = None
+        self._scheduler = None
+        self._frame_seq = 0
+        self._frame_media = None
+        # 离线回放的结果清单，非回放任务为None
+        self._replay_manifest = None
+        # 长文件分段并行回放的各段，不分段时为空
+        self._replay_chunks = []
+        # 分段回放时多个线程同时推理，算法不支持并发调用时串行执行
+        self._inference_mutex = None
         self.process_image_flag = False
         self.process_image_exit_flag = False
+        # 新帧到达或任务停止时唤醒处理线程，空闲和限流等待期间不占用cpu
+        self.frame_cond = threading.Condition()
+        self.frame_notify_time = 0.0
+        self.stats = TaskStats()
         self.image_thread = threading.Thread(target=self.process_frame)
 
     def __del__(self):
@@ -57,50 +86,258 @@ class CommonTask(Task):
             self.set_status(TaskStatus.not_supported)
             return
         self._algo_info = algo_manager.get_algo_info(self._algo_name)
+        # 解码输出尺寸和格式，按任务参数或算法声明的输入规格在pipeline内缩放和转换
+        self._output_caps = OutputCaps.from_param(self.algo_param_dict(), self._algo_info,
+                                                  latency_policy, acquire_mode)
+        if self._output_caps.replay:
+            self._replay_manifest = ReplayManifest(self._id, self._video_url, self._algo_name)
+            self._replay_chunks = self.plan_replay_chunks()
+            if not getattr(self._algo_bean, "thread_safe", False):
+                self._inference_mutex = threading.Lock()
+        # 算法支持批量推理时，和其它同算法任务共享调度器
+        self._scheduler = algo_manager.get_scheduler(self._algo_name)
         Task.start(self)
         self.image_thread.start()
         pass
 
     def stop(self):
         Task.stop(self)
-        self.process_image_exit_flag = True
-        pass
+        with self.frame_cond:
+            self.process_image_exit_flag = True
+            self.frame_cond.notify()
+
+    def algo_param_dict(self):
+        """ algoParam转换成字典，回放模式只支持本地文件和能拉模式取帧的媒体类型 """
+        param = algo_param_to_dict(self._algo_param)
+        if param.get("replay") and not is_file_uri(self._video_url):
+            log.warning("task={} replay only support file, ignore, uri={}".format(self._id, self._video_url))
+            param = dict(param)
+            param.pop("replay")
+        elif param.get("replay") and not MediaFactory.supports_pull(self._stream_type):
+            # 推模式下取帧跟不上解码会漏帧，也没有办法判断appsink中的帧已经取完
+            log.warning("task={} replay need pull mode, ignore, stream_type={}".format(self._id, self._stream_type))
+            param = dict(param)
+            param.pop("replay")
+        return param
+
+    def plan_replay_chunks(self):
+        """ 长文件按时长切成若干段并行回放，段数来自algoParam的replayChunks或配置 """
+        param = self.algo_param_dict()
+        try:
+            workers = int(param.get("replayChunks", CHUNK_WORKERS))
+        except (TypeError, ValueError):
+            workers = CHUNK_WORKERS
+        ranges = ReplayChunk.plan(source_builder.probe(self._video_url).duration, workers)
+        chunks = [ReplayChunk("{}#{}".format(self._id, i), self._video_url, self._stream_type, self._output_caps,
+                              SamplingPolicy.from_algo_param(param, time_interval), start_ns, stop_ns,
+                              self.process_image, self.is_stopped)
+                  for i, (start_ns, stop_ns) in enumerate(ranges)]
+        if chunks:
+            log.info("task={} replay split into {} chunks".format(self._id, len(chunks)))
+        return chunks
 
     # 打开视频
     def open_video(self):
-        return media_manager.open_stream(self._id, self._video_url, self, self._stream_type)
+        # 分段回放时每段自己打开流
+        if self._replay_chunks:
+            for chunk in self._replay_chunks:
+                chunk.start()
+            return True
+        # 重连时先释放出错的流，同一路流的其它任务仍在使用时不会停止pipeline
+        if self._media is not None:
+            media_manager.close_stream(self._id)
+            self._media = None
+        self._media = media_manager.open_stream(self._id, self._video_url, self, self._stream_type,
+                                                self._output_caps)
+        # 唤醒处理线程，按新的媒体选择推模式或拉模式
+        with self.frame_cond:
+            self.frame_cond.notify()
+        return self._media
 
     #  关闭视频
     def close_video(self):
+        if self._replay_chunks:
+            return
         media_manager.close_stream(self._id)
 
     # 内部算法需要实现 nvdia gpu
-    def on_frame_gpu(self, data, height, width, format_type, raw_type, pts, dts, duration):
-        if self.process_image_flag is False:
-            self.image_info = ImageInfo(data, height, width, format_type, raw_type)
-            self.process_image_flag = True
-        return
-
-    def on_frame_cpu(self, array, height, width, format_type, raw_type, pts, dts, duration):
-        if self.process_image_flag is False:
-            self.image_info = ImageInfo(array, height, width, format_type, raw_type)
-            self.process_image_flag = True
-        return
+    def on_frame_gpu(self, data, header):
+        if not self.sampling_policy.accept(header.pts, header.keyframe, header.duration):
+            self.stats.incr("frames_skipped")
+            return
+        with self.frame_cond:
+            if self.process_image_flag is False:
+                self.image_info = ImageInfo(data, header.height, header.width, header.format_type, header.raw_type)
+                self.notify_frame()
+
+    # 帧数据已经在媒体帧环中，这里只做通知，处理时再租用最新一帧
+    def on_frame_cpu(self, array, header):
+        if not self.sampling_policy.accept(header.pts, header.keyframe, header.duration):
+            self.stats.incr("frames_skipped")
+            return
+        with self.frame_cond:
+            if self.process_image_flag is False:
+                self.notify_frame()
+
+    def notify_frame(self):
+        """ 标记有新帧并唤醒处理线程，调用方需持有frame_cond """
+        self.process_image_flag = True
+        self.frame_notify_time = time.monotonic()
+        self.stats.incr("frames_notified")
+        self.frame_cond.notify()
+
+    def get_stats(self):
+        stats = self.stats.to_dict()
+        stats["sampling"] = self.sampling_policy.to_dict()
+        stats["startup"] = self.get_startup_stats()
+        if self._output_caps is not None:
+            stats["output"] = self._output_caps.to_dict()
+        if self._scheduler is not None:
+            stats["batch"] = self._scheduler.get_stats()
+        if self._replay_manifest is not None:
+            stats["replay"] = self._replay_manifest.summary()
+        if self._replay_chunks:
+            stats["chunks"] = [chunk.to_dict() for chunk in self._replay_chunks]
+        return stats
+
+    def on_eos(self, media, bus, msg):
+        # 回放时appsink中可能还有没取走的帧，由处理线程取完后结束
+        if self._replay_manifest is not None:
+            return
+        Task.on_eos(self, media, bus, msg)
+
+    def on_error(self, media, bus, msg):
+        # 回放出错不重新打开文件，否则已处理的帧会重复分析，由处理线程按失败结束回放
+        if self._replay_manifest is not None:
+            return
+        Task.on_error(self, media, bus, msg)
+
+    def finish_replay(self, media, failed=False):
+        """ 回放文件处理完毕或出错，写结果清单并结束任务，出错时任务状态为exception """
+        stats = {"task": self.stats.to_dict()}
+        if media is not None:
+            stats["media"] = media.get_stats()
+        if self._replay_chunks:
+            stats["chunks"] = [chunk.to_dict() for chunk in self._replay_chunks]
+        self._replay_manifest.finish(stats, failed)
+        self.set_status(TaskStatus.exception if failed else TaskStatus.over)
+        # 回放已结束，从登记中移除，重启后不再重跑覆盖结果清单；manager导入了任务工厂，这里延迟导入
+        from ..manager import task_manager
+        task_manager.forget_task(self)
+
+    def wait_replay_chunks(self):
+        """ 等待所有分段处理完毕，有分段失败时按回放失败结束 """
+        for chunk in self._replay_chunks:
+            while not chunk.done.wait(1):
+                if self.process_image_exit_flag:
+                    return
+        if not self.process_image_exit_flag:
+            self.finish_replay(None, any(chunk.failed for chunk in self._replay_chunks))
+
+    def update_algo_param(self, algo_param):
+        self.set_algo_param(algo_param)
+        self.sampling_policy = SamplingPolicy.from_algo_param(self.algo_param_dict(), time_interval)
+        output_caps = OutputCaps.from_param(self.algo_param_dict(), self._algo_info, latency_policy,
+                                            acquire_mode)
+        if self._output_caps is not None and output_caps != self._output_caps:
+            # 输出规格变化需要重新打开视频，由视频线程重连
+            self._output_caps = output_caps
+            self.set_open_status(False)
+        log.info("task={} update_algo_param param={} sampling={} output={} ok".format(
+            self._id, algo_param, self.sampling_policy.to_dict(), output_caps.to_dict()))
+        return True
+
+    def frame_seq(self, media):
+        """ 已处理的最新帧序号，媒体重连后帧环序号从头开始 """
+        if media is not self._frame_media:
+            self._frame_media = media
+            self._frame_seq = 0
+        return self._frame_seq
+
+    def acquire_image(self):
+        """ 取出待处理的帧,cpu帧从帧环租用最新一帧，gpu帧直接使用回调传入的数据 """
+        if self.image_info is not None:
+            image_info = self.image_info
+            self.image_info = None
+            return image_info
+        media = self._media
+        if media is None:
+            return None
+        slot = media.frame_ring.lease_latest(self.frame_seq(media))
+        if slot is None:
+            return None
+        self._frame_seq = slot.seq
+        return ImageInfo.from_slot(slot)
+
+    def wait_image(self, media):
+        """ 推模式，等待帧回调通知，返回(image_info, 通知时间)，媒体变化或任务停止时返回(None, 0) """
+        with self.frame_cond:
+            # 等待新帧
+            while not self.process_image_flag and not self.process_image_exit_flag and self._media is media:
+                self.frame_cond.wait()
+                self.stats.incr("wakeups")
+            if self.process_image_exit_flag or not self.process_image_flag:
+                return None, 0.0
+            # 采样限流已经在帧回调中按pts完成，这里只处理通过采样的帧
+            notify_time = self.frame_notify_time
+            image_info = self.acquire_image()
+            self.process_image_flag = False
+        return image_info, notify_time
+
+    def pull_image(self, media, next_due):
+        """ 拉模式，到下一次采样时间后从媒体取最新一帧，返回(image_info, 取帧时间)，没有可处理的帧时返回(None, 0) """
+        with self.frame_cond:
+            delay = next_due - time.monotonic()
+            if delay > 0 and not self.process_image_exit_flag:
+                self.frame_cond.wait(delay)
+            if self.process_image_exit_flag:
+                return None, 0.0
+        slot = media.pull_frame(self.frame_seq(media), PULL_TIMEOUT_MS)
+        if slot is None:
+            return None, 0.0
+        self._frame_seq = slot.seq
+        self.stats.incr("frames_notified")
+        if not self.sampling_policy.accept(slot.pts, slot.keyframe, slot.duration):
+            slot.release()
+            self.stats.incr("frames_skipped")
+            return None, 0.0
+        return ImageInfo.from_slot(slot), time.monotonic()
 
     # 异步处理on_frame
     def process_frame(self):
+        if self._replay_chunks:
+            self.wait_replay_chunks()
+            return
+        next_due = 0.0
         while not self.process_image_exit_flag:
-            if self.process_image_flag is False:
-                time.sleep(0.001)
-                continue
-            now = datetime.datetime.now()
-            time_cost = int((now - self.mq_last_time).seconds)
-            if time_cost < time_interval:
-                time.sleep(0.001)
+            media = self._media
+            if media is not None and media.appsink is not None:
+                image_info, notify_time = self.pull_image(media, next_due)
+                if image_info is None and self._replay_manifest is not None and self.replay_ended(media):
+                    self.finish_replay(media, not media.is_eos())
+                    return
+            else:
+                image_info, notify_time = self.wait_image(media)
+            if image_info is None:
                 continue
-            self.do_algo_task(self.image_info)
-            self.process_image_flag = False
-        time.sleep(0.001)
+            begin = self.process_image(image_info, notify_time)
+            next_due = begin + self.sampling_policy.interval()
+
+    def replay_ended(self, media):
+        """ 回放的媒体已经播放结束或出错，任务停止、重新打开视频时关闭的旧媒体不算 """
+        if self.process_image_exit_flag or media is not self._media:
+            return False
+        return media.is_eos() or media.failed
+
+    def process_image(self, image_info, notify_time):
+        """ 处理一帧并释放帧环租约，返回开始处理的时间 """
+        begin = time.monotonic()
+        try:
+            self.do_algo_task(image_info)
+        finally:
+            image_info.release()
+        self.stats.on_processed(1000 * (begin - notify_time), 1000 * (time.monotonic() - begin))
+        return begin
 
     def do_algo_task(self, image_info):
         # 算法
@@ -109,18 +346,21 @@ class CommonTask(Task):
         width = image_info.width
         format_type = image_info.format_type
         raw_type = image_info.raw_type
-        result = self._algo_bean.image_inference(array, height, width, format_type, raw_type)
-        if result.code == IoTxAlgorithmCodes.SUCCESS_CODE:
-            pic_filename = "T{}_{}.jpg".format(self._id,
-                                               time.strftime("%Y-%m-%d_%H:%M:%S",
-                                                             time.localtime(time.time())))
-            tools.compress_buf_to_jpg(format_type, width, height, array, PIC_PATH + pic_filename)
-
-            if "LINK_KIT" in os.environ:
-                # 定制，图片直接上传云端
-                oss_client.put_object_from_file(pic_filename, PIC_PATH + pic_filename)
-                oss_file_url = oss_client.generate_signed_url(pic_filename, 24*3600)
-                capture_time = time.mktime(datetime.datetime.now().timetuple())
-                self.msg_call_back(pic_filename, capture_time, result, oss_file_url)
-
-
+        if self._scheduler is not None:
+            result = self._scheduler.infer(image_info)
+        elif self._inference_mutex is not None:
+            with self._inference_mutex:
+                result = self._algo_bean.image_inference(array, height, width, format_type, raw_type)
+        else:
+            result = self._algo_bean.image_inference(array, height, width, format_type, raw_type)
+        if self._replay_manifest is not None:
+            self._replay_manifest.on_frame(image_info.pts)
+        if result is not None and result.code == IoTxAlgorithmCodes.SUCCESS_CODE:
+            pic_filename = snapshot_store.new_name(self._id)
+            if self._replay_manifest is not None:
+                self._replay_manifest.add(image_info.pts, pic_filename, result)
+            capture_time = time.mktime(datetime.datetime.now().timetuple())
+            # 编码、落盘、上传交给后处理流水线，报警帧复制一份，帧环租约处理完本帧即释放,
+            # 后处理排队不占用槽位，否则队列积压会把帧环占满导致丢帧
+            job = PostProcessJob(self, image_info.copy(), result, capture_time, pic_filename)
+            post_process_pipeline.submit(job)
@@ -48,8 +48,13 @@ class Task(object):
         self._algo_bean = None
         self._algo_info = None
         self._frame_rate = 25
-        # video(断线重连线程)
+        # 启动耗时统计: 提交到启动队列的时间，排队等待时间，启动(加载算法)耗时
+        self.submit_time = time.monotonic()
+        self.startup_wait_ms = 0.0
+        self.startup_cost_ms = 0.0
+        # video(打开视频线程)，断线重连由Media负责，Media放弃重连后这里重新打开
         self.video_thread = threading.Thread(target=self.run)
+        self.video_event = threading.Event()
         self.open_video_status = False
         self.open_video_exit_flag = False
         # 获取HTTP POST发送标志,  1 post , other value don't post jpg to server
@@ -63,10 +68,17 @@ class Task(object):
         pass
 
     def start(self):
+        # 启动流程结束，之后由视频线程更新状态
+        if self._task_status == TaskStatus.starting:
+            self._task_status = TaskStatus.unexecuted
         self.video_thread.start()
 
     def stop(self):
         self.open_video_exit_flag = True
+        self.video_event.set()
+
+    def is_stopped(self):
+        return self.open_video_exit_flag
 
     def run(self):
         while not self.open_video_exit_flag:
@@ -77,7 +89,8 @@ class Task(object):
                     if not self.open_video():
                         self.set_status(TaskStatus.exception)
                         self.set_open_status(False)
-            time.sleep(3)
+            self.video_event.wait(3)
+            self.video_event.clear()
         self.close_video()
 
     # 第三方算法需要重写这个函数
@@ -104,17 +117,18 @@ class Task(object):
             self.event_queue.put(algo_event.to_json())
 
     # 内部算法需要实现
-    def on_frame_h264(self, data, height, width, format_type, raw_type):
+    def on_frame_h264(self, data, header):
         pass
 
     # 内部算法需要实现
-    def on_frame_cpu(self, array, height, width, format_type, raw_type, pts, dts, duration):
+    def on_frame_cpu(self, array, header):
         pass
 
     # 内部算法需要实现 nvdia gpu
-    def on_frame_gpu(self, data, height, width, format_type, raw_type, pts, dts, duration):
+    def on_frame_gpu(self, data, header):
         pass
 
+    # Media重连次数用尽后回调
     def on_error(self, media, bus, msg):
         self.set_open_status(False)
 
@@ -152,6 +166,13 @@ class Task(object):
     def set_framerate(self, framerate: "int"):
         self._frame_rate = framerate
 
+    # 任务运行统计，子类按需实现
+    def get_startup_stats(self):
+        return {"wait_ms": self.startup_wait_ms, "cost_ms": self.startup_cost_ms}
+
+    def get_stats(self):
+        return {"startup": self.get_startup_stats()}
+
     def get_algo_param(self):
         return self._algo_param
 
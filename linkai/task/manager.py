@@ -23,11 +23,15 @@ import threading
 import queue
 from linkai import conf
 from .factory.task_factory import TaskFactory
-from .model.task_param import TaskParamTO
+from .model.task_param import TaskParamTO, TaskStatus
+from .registry import task_registry
 
 log = logging.getLogger(__name__)
-PIC_PATH = "static/images/"
-MAX_PIC_NUM = conf.get_int("OSS_CFG", "max_pic_number")
+
+# 并行启动任务的线程数，任务启动时加载算法模型耗时较长，串行启动会让后面的任务长时间排队
+STARTUP_WORKERS = conf.get_int("Task", "startup_workers")
+# 进程启动时是否按持久化登记恢复任务
+RESTORE_ON_BOOT = conf.get_int("Task", "restore_on_boot") == 1
 
 
 class TaskManager(object):
@@ -36,29 +40,52 @@ class TaskManager(object):
     对基类为Task的任务类进行管理
     Attributes:
         dict_tasks: 任务集合MAP（所有任务）
-        task_thread: 任务管理线程，不堵住主线程而另外启动的线程，让任务可以异步执行
+        task_threads: 任务启动线程，不堵住主线程而另外启动的线程，让任务可以异步并行启动
         task_queue:  异步还需要处理的任务队列（待执行任务）
         task_thread_exit_flag: 任务处理线程退出，目前不会退出。
     """
 
     def __init__(self):
         # 任务线程，为了不卡网络线程，单独启动线程运行task
-        self.task_thread = threading.Thread(target=TaskManager.run, args=(self,))
         self.task_thread_exit_flag = False
         self.dict_tasks = {}
         self.dict_tasks_mutex = threading.Lock()
-        self.task_queue = queue.Queue(100)
-        self.task_thread.start()
-        pass
+        # 不限长度，批量启动大量任务时接口不会阻塞在入队上
+        self.task_queue = queue.Queue()
+        self.task_threads = []
+        for i in range(max(1, STARTUP_WORKERS)):
+            thread = threading.Thread(target=self.run, name="TaskStartup-{}".format(i))
+            thread.start()
+            self.task_threads.append(thread)
 
     def run(self):
-        """任务线程,每次取出队列中的一个任务进行执行"""
+        """任务启动线程，阻塞等待队列中的任务并启动，多个线程并行启动"""
         while not self.task_thread_exit_flag:
-            if not self.task_queue.empty():
-                task_bean = self.task_queue.get()
-                task_bean.start()
-            else:
-                time.sleep(0.1)
+            task_bean = self.task_queue.get()
+            if task_bean is None:
+                break
+            self.start_task(task_bean)
+
+    def start_task(self, task_bean):
+        # 排队期间已经被停止的任务不再启动
+        if task_bean.is_stopped():
+            log.info("task_id={} stopped before startup, skip".format(task_bean.get_task_id()))
+            return
+        begin = time.monotonic()
+        task_bean.startup_wait_ms = 1000 * (begin - task_bean.submit_time)
+        task_bean.set_status(TaskStatus.starting)
+        try:
+            task_bean.start()
+        except Exception as e:
+            log.error("task_id={} start error={}".format(task_bean.get_task_id(), e), exc_info=True)
+            task_bean.set_status(TaskStatus.exception)
+        if task_bean.get_status() == TaskStatus.not_supported:
+            # 不支持的算法重启后也无法运行，不再恢复
+            self.forget_task(task_bean)
+        task_bean.startup_cost_ms = 1000 * (time.monotonic() - begin)
+        log.info("task_id={} startup status={} wait_ms={:.1f} cost_ms={:.1f}".format(
+            task_bean.get_task_id(), task_bean.get_status().name, task_bean.startup_wait_ms,
+            task_bean.startup_cost_ms))
 
     def get_task_by_id(self, task_id):
         task_bean = None
@@ -78,33 +105,91 @@ class TaskManager(object):
 
     def start_algo_task(self, task_param: "TaskParamTO"):
         """启动一个算法任务，通过任务工厂创建任务，然后启动任务"""
-        task_bean = self.get_task_by_id(task_param.task_id)
-        if task_bean is not None:
-            log.error("start_algo_task err, task_id={} is exist".format(task_param.task_id))
-            return False
-        task_bean = TaskFactory.create_task(task_param)
+        return self.start_algo_tasks([task_param])[0]
+
+    def start_algo_tasks(self, list_task_param, persist=True):
+        """批量启动算法任务，一次加锁登记所有任务后放入启动队列并行启动，返回每个任务是否成功"""
+        results = []
+        list_task_bean = []
         self.dict_tasks_mutex.acquire()
-        self.dict_tasks[task_param.task_id] = task_bean
+        for task_param in list_task_param:
+            if task_param.task_id in self.dict_tasks.keys():
+                log.error("start_algo_task err, task_id={} is exist".format(task_param.task_id))
+                results.append(False)
+                continue
+            task_bean = TaskFactory.create_task(task_param)
+            self.dict_tasks[task_param.task_id] = task_bean
+            list_task_bean.append(task_bean)
+            results.append(True)
+        # 持锁写登记，保证登记顺序和dict_tasks的变更顺序一致，同一任务并发启停时不会先记stop后记start
+        if persist:
+            task_registry.record_start([task_param for task_param, ret in zip(list_task_param, results) if ret])
         self.dict_tasks_mutex.release()
-        self.task_queue.put(task_bean)
-        log.info("start_algo_task param={}".format(task_param.to_json()))
-        return True
+        for task_bean in list_task_bean:
+            task_bean.submit_time = time.monotonic()
+            self.task_queue.put(task_bean)
+        for task_param, ret in zip(list_task_param, results):
+            if ret:
+                log.info("start_algo_task param={}".format(task_param.to_json()))
+        return results
 
     def stop_algo_task(self, task_id):
         """关闭一个算法任务"""
-        task_bean = self.pop_task_by_id(task_id)
-        if task_bean is None:
-            log.error("stop task_id={} failed total={}".format(task_id, len(self.dict_tasks)))
-            return False
-        task_bean.stop()
-        log.info("stop task_id={} success total={}".format(task_id, len(self.dict_tasks)))
-        return True
+        return self.stop_algo_tasks([task_id])[0]
+
+    def stop_algo_tasks(self, list_task_id):
+        """批量关闭算法任务，返回每个任务是否成功"""
+        list_task_bean = []
+        self.dict_tasks_mutex.acquire()
+        for task_id in list_task_id:
+            list_task_bean.append(self.dict_tasks.pop(task_id, None))
+        task_registry.record_stop([task_id for task_id, task_bean in zip(list_task_id, list_task_bean)
+                                   if task_bean is not None])
+        self.dict_tasks_mutex.release()
+        results = []
+        for task_id, task_bean in zip(list_task_id, list_task_bean):
+            if task_bean is None:
+                log.error("stop task_id={} failed total={}".format(task_id, len(self.dict_tasks)))
+                results.append(False)
+                continue
+            task_bean.stop()
+            log.info("stop task_id={} success total={}".format(task_id, len(self.dict_tasks)))
+            results.append(True)
+        return results
+
+    def forget_task(self, task_bean):
+        """任务自行结束后从登记中移除，重启后不再恢复，任务仍保留在dict_tasks中可以查询
+        同一task_id已被停止并重新启动时不再记录，避免删掉新任务的登记"""
+        self.dict_tasks_mutex.acquire()
+        if self.dict_tasks.get(task_bean.get_task_id()) is task_bean:
+            task_registry.record_stop([task_bean.get_task_id()])
+        self.dict_tasks_mutex.release()
 
     def update_algo_task(self, task_id, algo_param):
-        task_bean = self.get_task_by_id(task_id)
-        if task_bean is None:
-            return False
-        return task_bean.update_algo_param(algo_param)
+        return self.update_algo_tasks([(task_id, algo_param)])[0]
+
+    def update_algo_tasks(self, list_task_param):
+        """批量更新算法参数，list_task_param为[(task_id, algo_param), ...]，返回每个任务是否成功"""
+        results = []
+        for task_id, algo_param in list_task_param:
+            task_bean = self.get_task_by_id(task_id)
+            results.append(task_bean is not None and task_bean.update_algo_param(algo_param))
+        task_registry.record_update([item for item, ret in zip(list_task_param, results) if ret])
+        return results
+
+    def restore_tasks(self):
+        """按持久化登记恢复上次运行的任务，由启动线程并行启动"""
+        if not RESTORE_ON_BOOT:
+            return 0
+        list_task_param = []
+        for dct in task_registry.get_tasks():
+            try:
+                list_task_param.append(TaskParamTO.from_dict(dct))
+            except KeyError as e:
+                log.error("restore task param={} invalid error={}".format(dct, e))
+        results = self.start_algo_tasks(list_task_param, persist=False)
+        log.info("restore tasks total={} success={}".format(len(results), results.count(True)))
+        return results.count(True)
 
     def get_all_algo_tasks(self):
         """获取所有算法任务"""
@@ -19,9 +19,26 @@
 
 
 class ImageInfo(object):
-    def __init__(self, array, height, width, format_type, raw_type):
+    def __init__(self, array, height, width, format_type, raw_type, slot=None, pts=None):
         self.array = array
         self.height = height
         self.width = width
         self.format_type = format_type
         self.raw_type = raw_type
+        # 帧时间戳(纳秒)，回放结果按pts记录
+        self.pts = pts
+        # 帧环槽位租约，处理完成后需要release
+        self.slot = slot
+
+    @staticmethod
+    def from_slot(slot):
+        return ImageInfo(slot.array, slot.height, slot.width, slot.format_type, slot.raw_type, slot, slot.pts)
+
+    def copy(self):
+        """ 复制帧数据到不占用帧环槽位的ImageInfo，本对象的租约仍由调用方释放 """
+        return ImageInfo(self.array.copy(), self.height, self.width, self.format_type, self.raw_type, None, self.pts)
+
+    def release(self):
+        if self.slot is not None:
+            self.slot.release()
+            self.slot = None
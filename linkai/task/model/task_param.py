@@ -22,7 +22,7 @@ import json
 
 
 # todo 0 未分配，1. 未运行 2.运行异常 3.运行中 4.运行结束 5. 算法不支持 6. 未打开视频 7. 解码失败
-# 1. 未分配 2. 未运行  3. 运行中 4. 运行异常  5. 正常结束  6. 视频源异常
+# 1. 未分配 2. 未运行  3. 运行中 4. 运行异常  5. 正常结束  6. 视频源异常 7. 启动中(加载算法)
 class TaskStatus(Enum):
     unallocated = 1
     unexecuted = 2
@@ -30,6 +30,7 @@ class TaskStatus(Enum):
     exception = 4
     over = 5
     not_supported = 6
+    starting = 7
 
 
 # TO(Transfer Object) ，数据传输对象, 在应用程序不同 tie( 关系 ) 之间传输的对象
@@ -50,3 +51,24 @@ class TaskParamTO(object):
 
     def to_json(self):
         return json.dumps(self, default=lambda o: o.__dict__)
+
+    @staticmethod
+    def from_dict(dct):
+        task_param = TaskParamTO(dct["task_id"], dct.get("device_id"), dct.get("video_url", ""), dct["algo_name"],
+                                 dct.get("algo_param"), dct.get("record", False))
+        task_param.stream_type = dct.get("stream_type", task_param.stream_type)
+        return task_param
+
+
+def algo_param_to_dict(algo_param):
+    """ algoParam 可以是字典，也可以是json字符串，统一转换成字典，无法解析时返回空字典 """
+    if isinstance(algo_param, dict):
+        return algo_param
+    if isinstance(algo_param, (str, bytes)) and len(algo_param) > 0:
+        try:
+            param = json.loads(algo_param)
+            if isinstance(param, dict):
+                return param
+        except ValueError:
+            pass
+    return {}
@@ -0,0 +1,68 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import threading
+
+# 平滑系数，延时统计使用指数滑动平均
+EWMA_ALPHA = 0.1
+
+
+class TaskStats(object):
+    """
+    任务运行统计
+
+    Attributes:
+        wakeups: 处理线程被唤醒次数
+        frames_notified: 收到的新帧通知次数
+        frames_skipped: 被采样策略跳过的帧数
+        frames_processed: 实际送入算法的帧数
+        handoff_latency_ms: 新帧通知到开始处理的延时(滑动平均)
+        process_cost_ms: 单帧算法处理耗时(滑动平均)
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self.wakeups = 0
+        self.frames_notified = 0
+        self.frames_skipped = 0
+        self.frames_processed = 0
+        self.handoff_latency_ms = 0.0
+        self.max_handoff_latency_ms = 0.0
+        self.process_cost_ms = 0.0
+
+    @staticmethod
+    def _ewma(old, value):
+        if old == 0.0:
+            return value
+        return old + EWMA_ALPHA * (value - old)
+
+    def incr(self, name, value=1):
+        with self._mutex:
+            setattr(self, name, getattr(self, name) + value)
+
+    def on_processed(self, handoff_latency_ms, process_cost_ms):
+        with self._mutex:
+            self.frames_processed += 1
+            self.handoff_latency_ms = self._ewma(self.handoff_latency_ms, handoff_latency_ms)
+            self.max_handoff_latency_ms = max(self.max_handoff_latency_ms, handoff_latency_ms)
+            self.process_cost_ms = self._ewma(self.process_cost_ms, process_cost_ms)
+
+    def to_dict(self):
+        with self._mutex:
+            return {key: value for key, value in self.__dict__.items() if not key.startswith("_")}
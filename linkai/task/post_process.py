@@ -0,0 +1,250 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import collections
+import threading
+import logging
+import time
+import os
+
+from linkai import conf
+from linkai.utils import tools
+from linkai.oss.client import oss_client
+from linkai.snapshot.store import snapshot_store
+from .model.task_stats import EWMA_ALPHA
+
+log = logging.getLogger(__name__)
+
+# oss签名url有效期(秒)
+SIGNED_URL_VALID_TIME = 24 * 3600
+
+
+class DropPolicy(object):
+    """
+    队列满时的处理策略
+    """
+    # 丢弃最老的任务，保证最新的报警优先处理
+    DROP_OLDEST = "drop_oldest"
+    # 丢弃新提交的任务
+    DROP_NEWEST = "drop_newest"
+    # 阻塞提交方，直到队列有空位
+    BLOCK = "block"
+
+
+class PostProcessJob(object):
+    """ 一次报警的后处理任务
+
+    Attributes:
+        task: 产生报警的任务
+        image_info: 报警帧的副本，不占用帧环槽位，编码完成后释放
+        result: 算法结果
+        capture_time: 抓拍时间
+        pic_filename: 图片文件名
+        jpg_data: 编码后的jpg数据
+        oss_file_url: oss签名url
+    """
+
+    def __init__(self, task, image_info, result, capture_time, pic_filename):
+        self.task = task
+        self.image_info = image_info
+        self.result = result
+        self.capture_time = capture_time
+        self.pic_filename = pic_filename
+        self.jpg_data = None
+        self.oss_file_url = None
+        self.enqueue_time = 0.0
+
+    def release_image(self):
+        if self.image_info is not None:
+            self.image_info.release()
+            self.image_info = None
+
+
+class PipelineStage(object):
+    """ 流水线中的一级，自带有界队列和若干工作线程
+
+    handler(job)返回True时进入下一级，返回False表示流程在本级结束
+    """
+
+    def __init__(self, name, handler, workers, queue_size, drop_policy):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.drop_policy = drop_policy
+        self.next_stage = None
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.wait_ms = 0.0
+        self.cost_ms = 0.0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.run, name="PostProcess-{}-{}".format(self.name, i), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, job):
+        """ 提交任务，被丢弃时返回False """
+        with self._cond:
+            if len(self._queue) >= self.queue_size:
+                if self.drop_policy == DropPolicy.BLOCK:
+                    while len(self._queue) >= self.queue_size:
+                        self._cond.wait()
+                elif self.drop_policy == DropPolicy.DROP_OLDEST:
+                    self._drop(self._queue.popleft())
+                else:
+                    self._drop(job)
+                    return False
+            job.enqueue_time = time.monotonic()
+            self._queue.append(job)
+            self._cond.notify_all()
+        return True
+
+    def _drop(self, job):
+        self.dropped += 1
+        job.release_image()
+        log.warning("post process stage={} queue full, drop pic={}".format(self.name, job.pic_filename))
+
+    @staticmethod
+    def _ewma(old, value):
+        if old == 0.0:
+            return value
+        return old + EWMA_ALPHA * (value - old)
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                self._cond.notify_all()
+            begin = time.monotonic()
+            try:
+                go_on = self.handler(job)
+            except Exception as e:
+                log.error("post process stage={} pic={} error={}".format(self.name, job.pic_filename, e),
+                          exc_info=True)
+                go_on = False
+                self.failed += 1
+            end = time.monotonic()
+            with self._cond:
+                self.processed += 1
+                self.wait_ms = self._ewma(self.wait_ms, 1000 * (begin - job.enqueue_time))
+                self.cost_ms = self._ewma(self.cost_ms, 1000 * (end - begin))
+            if go_on and self.next_stage is not None:
+                self.next_stage.put(job)
+            else:
+                job.release_image()
+
+    def get_stats(self):
+        with self._cond:
+            return {"queue": len(self._queue), "queue_size": self.queue_size, "workers": self.workers,
+                    "processed": self.processed, "dropped": self.dropped, "failed": self.failed,
+                    "wait_ms": self.wait_ms, "cost_ms": self.cost_ms}
+
+
+class PostProcessPipeline(object):
+    """ 报警后处理流水线，单件实例post_process_pipeline
+
+    编码 -> 上传 -> 签名 -> 发布事件，图片在内存中编码后直接从buffer上传,
+    本地留存作为旁路异步落盘，不在上传路径上。每一级独立的有界队列和工作线程,
+    推理线程只负责提交，网络慢时按丢弃策略丢弃，不影响推理节奏
+    Attributes:
+        stages: 按顺序排列的各级
+        persist_stage: 本地留存旁路
+        upload_enable: 是否上传云端
+        save_local: 是否在本地留存图片
+    """
+
+    def __init__(self):
+        queue_size = conf.get_int("PostProcess", "queue_size")
+        drop_policy = conf.get_string("PostProcess", "drop_policy")
+        encode_workers = conf.get_int("PostProcess", "encode_workers")
+        upload_workers = conf.get_int("PostProcess", "upload_workers")
+        self.save_local = conf.get_int("PostProcess", "save_local") == 1
+        # 定制，图片直接上传云端
+        self.upload_enable = "LINK_KIT" in os.environ
+        self.upload_failed = 0
+        self._upload_failed_mutex = threading.Lock()
+        self.stages = [
+            PipelineStage("encode", self._encode, encode_workers, queue_size, drop_policy),
+            PipelineStage("upload", self._upload, upload_workers, queue_size, drop_policy),
+            PipelineStage("sign", self._sign, 1, queue_size, drop_policy),
+            PipelineStage("publish", self._publish, 1, queue_size, drop_policy),
+        ]
+        self.persist_stage = PipelineStage("persist", self._persist, 1, queue_size, drop_policy)
+        for i in range(len(self.stages) - 1):
+            self.stages[i].next_stage = self.stages[i + 1]
+        for stage in self.stages + [self.persist_stage]:
+            stage.start()
+
+    def _encode(self, job):
+        image_info = job.image_info
+        job.jpg_data = tools.compress_buf_to_jpg_data(image_info.format_type, image_info.width, image_info.height,
+                                                      image_info.array)
+        job.release_image()
+        if job.jpg_data is None:
+            return False
+        if self.save_local:
+            self.persist_stage.put(job)
+        return self.upload_enable
+
+    @staticmethod
+    def _persist(job):
+        snapshot_store.save(job.pic_filename, job.jpg_data)
+        return False
+
+    def _upload(self, job):
+        """ 上传失败只记录，仍然签名并发布事件，oss不稳定时不丢报警 """
+        if not oss_client.put_object_from_buffer(job.pic_filename, job.jpg_data):
+            with self._upload_failed_mutex:
+                self.upload_failed += 1
+            log.warning("post process upload pic={} failed, publish event anyway".format(job.pic_filename))
+        return True
+
+    @staticmethod
+    def _sign(job):
+        job.oss_file_url = oss_client.generate_signed_url(job.pic_filename, SIGNED_URL_VALID_TIME)
+        return True
+
+    @staticmethod
+    def _publish(job):
+        job.task.msg_call_back(job.pic_filename, job.capture_time, job.result, job.oss_file_url)
+        return False
+
+    def submit(self, job: "PostProcessJob"):
+        if not self.upload_enable and not self.save_local:
+            job.release_image()
+            return False
+        return self.stages[0].put(job)
+
+    def get_stats(self):
+        stats = {stage.name: stage.get_stats() for stage in self.stages}
+        stats[self.persist_stage.name] = self.persist_stage.get_stats()
+        with self._upload_failed_mutex:
+            stats["upload"]["upload_failed"] = self.upload_failed
+        return stats
+
+
+post_process_pipeline = PostProcessPipeline()
@@ -0,0 +1,160 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import threading
+import logging
+import json
+import os
+
+from linkai import conf
+
+log = logging.getLogger(__name__)
+
+OP_START = "start"
+OP_STOP = "stop"
+OP_UPDATE = "update"
+
+
+class TaskRegistry(object):
+    """ 任务持久化登记，单件实例task_registry
+
+    任务的启动、停止、参数更新以追加方式写入日志文件(每行一条json)，进程重启后回放日志恢复任务。
+    追加的记录数超过compact_threshold且超过存活任务数的2倍时重写日志，只保留存活任务，日志大小有上界
+    Attributes:
+        path: 日志文件路径，为空表示不持久化
+        compact_threshold: 触发压缩的最少记录数
+        records: 当前日志中的记录数
+        compactions: 压缩次数
+    """
+
+    def __init__(self, path, compact_threshold):
+        self.path = path
+        self.compact_threshold = max(1, compact_threshold)
+        self.records = 0
+        self.compactions = 0
+        # task_id -> 任务参数字典，和日志回放结果一致
+        self._tasks = {}
+        self._mutex = threading.Lock()
+        self._file = None
+        if self.enable():
+            self._load()
+
+    def enable(self):
+        return len(self.path) > 0
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        invalid = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            content = f.read()
+        for line_no, line in enumerate(content.splitlines(), 1):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                self._apply(json.loads(line))
+                self.records += 1
+            except (ValueError, KeyError, TypeError) as e:
+                # 掉电时最后一行可能不完整，跳过
+                invalid += 1
+                log.warning("task registry file={} line={} invalid error={}".format(self.path, line_no, e))
+        log.info("task registry file={} records={} tasks={}".format(self.path, self.records, len(self._tasks)))
+        # 有损坏的行或者最后一行没有换行时重写一次，避免后续追加的记录接在残缺行后面
+        if invalid > 0 or (len(content) > 0 and not content.endswith("\n")):
+            self._compact()
+
+    def _apply(self, record):
+        op = record["op"]
+        if op == OP_START:
+            param = record["param"]
+            self._tasks[param["task_id"]] = param
+        elif op == OP_STOP:
+            self._tasks.pop(record["task_id"], None)
+        elif op == OP_UPDATE:
+            param = self._tasks.get(record["task_id"])
+            if param is not None:
+                param["algo_param"] = record["algo_param"]
+
+    def _append(self, records):
+        """ 追加一批记录，一次写入一次fsync，调用方需持有_mutex """
+        for record in records:
+            self._apply(record)
+        if not self.enable() or len(records) == 0:
+            return
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.records += len(records)
+        except OSError as e:
+            log.error("task registry file={} write error={}".format(self.path, e))
+            return
+        if self.records >= self.compact_threshold and self.records > 2 * len(self._tasks):
+            self._compact()
+
+    def _compact(self):
+        """ 重写日志只保留存活任务，先写临时文件再原子替换 """
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for param in self._tasks.values():
+                    f.write(json.dumps({"op": OP_START, "param": param}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.error("task registry file={} compact error={}".format(self.path, e))
+            return
+        self.records = len(self._tasks)
+        self.compactions += 1
+        log.info("task registry file={} compacted tasks={}".format(self.path, len(self._tasks)))
+
+    def record_start(self, list_task_param):
+        with self._mutex:
+            self._append([{"op": OP_START, "param": dict(task_param.__dict__)} for task_param in list_task_param])
+
+    def record_stop(self, list_task_id):
+        with self._mutex:
+            self._append([{"op": OP_STOP, "task_id": task_id} for task_id in list_task_id])
+
+    def record_update(self, list_task_param):
+        """ list_task_param为[(task_id, algo_param), ...] """
+        with self._mutex:
+            self._append([{"op": OP_UPDATE, "task_id": task_id, "algo_param": algo_param}
+                          for task_id, algo_param in list_task_param])
+
+    def get_tasks(self):
+        """ 回放得到的存活任务参数列表 """
+        with self._mutex:
+            return [dict(param) for param in self._tasks.values()]
+
+    def get_stats(self):
+        with self._mutex:
+            return {"path": self.path, "records": self.records, "tasks": len(self._tasks),
+                    "compactions": self.compactions}
+
+
+task_registry = TaskRegistry(conf.get_string("Task", "registry_file"),
+                             conf.get_int("Task", "registry_compact_threshold"))
@@ -0,0 +1,229 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import threading
+import logging
+import json
+import time
+import os
+
+from linkai import conf
+from linkai.media.manager import media_manager
+from .model.image_info import ImageInfo
+
+log = logging.getLogger(__name__)
+
+MANIFEST_DIR = conf.get_string("Replay", "manifest_dir")
+# 分段并行回放的段数，0表示cpu核数，algoParam的replayChunks可以按任务覆盖，1表示不分段
+CHUNK_WORKERS = conf.get_int("Replay", "chunk_workers")
+# 每段最短时长(秒)，短文件不分段
+MIN_CHUNK_SECONDS = conf.get_int("Replay", "min_chunk_seconds")
+NS_PER_MS = 1000000
+NS_PER_SECOND = 1000000000
+# 等待新帧的最长时间，超时后重新检查任务状态
+PULL_TIMEOUT_MS = 100
+
+
+class ReplayManifest(object):
+    """ 离线回放的结果清单
+
+    回放过程中记录每个有结果的帧，文件播放结束后按pts排序写入manifest_dir/<task_id>.json,
+    分段并行回放时各段共用一个清单
+    Attributes:
+        task_id: 任务id
+        uri: 回放的文件
+        algo_name: 算法名
+        results: [{"pts_ms", "pic", "events"}]，按处理顺序
+        path: 清单文件路径，写入后才有值
+        failed: 回放中途出错，清单中的结果不完整
+    """
+
+    def __init__(self, task_id, uri, algo_name):
+        self.task_id = task_id
+        self.uri = uri
+        self.algo_name = algo_name
+        self.results = []
+        self.path = None
+        self.start_time = time.time()
+        self.finish_time = 0.0
+        self.failed = False
+        self._first_pts = None
+        self._last_pts = None
+        self._mutex = threading.Lock()
+
+    def on_frame(self, pts):
+        """ 记录处理过的帧的pts，用来计算回放的媒体时长 """
+        if pts is None:
+            return
+        with self._mutex:
+            if self._first_pts is None or pts < self._first_pts:
+                self._first_pts = pts
+            if self._last_pts is None or pts > self._last_pts:
+                self._last_pts = pts
+
+    def add(self, pts, pic_filename, result):
+        """ 记录一帧的算法结果，结果无法序列化时只丢弃这一条，不影响回放继续处理 """
+        try:
+            events = json.loads(result.to_json()).get("data", [])
+        except Exception as e:
+            log.error("task={} replay result pts={} serialize failed, error={}".format(self.task_id, pts, e))
+            return
+        with self._mutex:
+            self.results.append({"pts_ms": None if pts is None else pts // NS_PER_MS,
+                                 "pic": pic_filename, "events": events})
+
+    def summary(self):
+        with self._mutex:
+            finish_time = self.finish_time or time.time()
+            elapsed = finish_time - self.start_time
+            media_seconds = 0.0
+            if self._first_pts is not None:
+                media_seconds = (self._last_pts - self._first_pts) / (1000 * NS_PER_MS)
+            return {"task_id": self.task_id, "uri": self.uri, "algo_name": self.algo_name,
+                    "start_time": self.start_time, "finish_time": self.finish_time,
+                    "elapsed_seconds": elapsed, "media_seconds": media_seconds,
+                    "speed": media_seconds / elapsed if elapsed > 0 else 0.0,
+                    "results": len(self.results), "failed": self.failed, "path": self.path}
+
+    def finish(self, stats=None, failed=False):
+        """ 写入清单文件，先写临时文件再替换，返回文件路径，失败返回None """
+        with self._mutex:
+            self.finish_time = time.time()
+            self.failed = failed
+        manifest = self.summary()
+        manifest["stats"] = stats or {}
+        with self._mutex:
+            # 分段并行时各段的结果交错，按时间戳合并
+            manifest["results"] = sorted(self.results, key=lambda item: (item["pts_ms"] is None, item["pts_ms"]))
+        path = os.path.join(MANIFEST_DIR, "{}.json".format(self.task_id))
+        try:
+            os.makedirs(MANIFEST_DIR, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            log.error("task={} write replay manifest failed, error={}".format(self.task_id, e))
+            return None
+        self.path = path
+        log.info("task={} replay over, failed={} results={} elapsed={:.1f}s speed={:.1f}x manifest={}".format(
+            self.task_id, failed, len(manifest["results"]), manifest["elapsed_seconds"], manifest["speed"], path))
+        return path
+
+
+class ReplayChunk(object):
+    """ 长文件分段并行回放中的一段
+
+    每段单独打开一路流，从起点之前最近的关键帧开始解码，只处理位置落在本段[start_ns, stop_ns)内的帧,
+    起点之前的帧属于上一段。各段在自己的线程中取帧，交给handler(image_info, notify_time)处理
+    Attributes:
+        stream_id: 本段的流id，任务id#段序号
+        start_ns: 本段起点
+        stop_ns: 本段终点，最后一段为None
+        frames: 本段送处理的帧数
+        failed: 本段打开失败、出错或处理异常，结果清单中缺少本段的部分结果
+        done: 本段处理结束
+    """
+
+    def __init__(self, stream_id, uri, stream_type, output_caps, sampling_policy, start_ns, stop_ns, handler,
+                 is_stopped):
+        self.stream_id = stream_id
+        self.uri = uri
+        self.stream_type = stream_type
+        self.output_caps = output_caps
+        self.sampling_policy = sampling_policy
+        self.start_ns = start_ns
+        self.stop_ns = stop_ns
+        self.handler = handler
+        self.is_stopped = is_stopped
+        self.frames = 0
+        self.failed = False
+        self.media_stats = {}
+        self.done = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def plan(duration_ns, workers):
+        """ 按时长均分，最多workers段，每段不短于MIN_CHUNK_SECONDS，不需要分段时返回空列表 """
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        if duration_ns <= 0 or workers <= 1:
+            return []
+        count = min(workers, duration_ns // max(1, MIN_CHUNK_SECONDS * NS_PER_SECOND))
+        if count <= 1:
+            return []
+        step = duration_ns // count
+        return [(i * step, (i + 1) * step if i < count - 1 else None) for i in range(count)]
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name="Replay-{}".format(self.stream_id), daemon=True)
+        self._thread.start()
+
+    def owns(self, slot):
+        position = slot.stream_time if slot.stream_time is not None else slot.pts
+        if position is None:
+            return True
+        return position >= self.start_ns and (self.stop_ns is None or position < self.stop_ns)
+
+    def run(self):
+        media = None
+        try:
+            media = media_manager.open_stream(self.stream_id, self.uri, None, self.stream_type, self.output_caps,
+                                              (self.start_ns, self.stop_ns))
+            if media is None:
+                log.error("replay chunk stream_id={} open failed".format(self.stream_id))
+                self.failed = True
+                return
+            if media.appsink is None:
+                log.error("replay chunk stream_id={} need pull mode, type={}".format(self.stream_id,
+                                                                                   self.stream_type))
+                self.failed = True
+                return
+            seq = 0
+            while not self.is_stopped():
+                slot = media.pull_frame(seq, PULL_TIMEOUT_MS)
+                if slot is None:
+                    if media.is_eos():
+                        break
+                    if media.failed:
+                        self.failed = True
+                        break
+                    continue
+                seq = slot.seq
+                if not self.owns(slot) or not self.sampling_policy.accept(slot.pts, slot.keyframe, slot.duration):
+                    slot.release()
+                    continue
+                self.frames += 1
+                self.handler(ImageInfo.from_slot(slot), time.monotonic())
+        except Exception as e:
+            log.error("replay chunk stream_id={} error={}".format(self.stream_id, e), exc_info=True)
+            self.failed = True
+        finally:
+            if media is not None:
+                self.media_stats = media.get_stats()
+                media_manager.close_stream(self.stream_id)
+            log.info("replay chunk stream_id={} over, failed={} frames={}".format(self.stream_id, self.failed,
+                                                                                  self.frames))
+            self.done.set()
+
+    def to_dict(self):
+        return {"stream_id": self.stream_id, "start_ns": self.start_ns, "stop_ns": self.stop_ns,
+                "frames": self.frames, "failed": self.failed, "done": self.done.is_set(), "media": self.media_stats}
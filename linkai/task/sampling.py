@@ -0,0 +1,140 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import time
+import logging
+
+from linkai import conf
+from .model.task_param import algo_param_to_dict
+
+log = logging.getLogger(__name__)
+
+# GstBuffer pts无效值 GST_CLOCK_TIME_NONE
+CLOCK_TIME_NONE = 2 ** 64 - 1
+NS_PER_SECOND = 1000000000
+# 回放模式没有配置采样策略时每N帧取一帧
+REPLAY_EVERY_N = conf.get_int("Replay", "default_every_n")
+
+
+class SamplingMode(object):
+    """
+    推理采样模式
+    """
+    # 每帧都送推理
+    ALL = "all"
+    # 按目标帧率采样，允许小数，例如0.2表示5秒一帧, 5表示每秒5帧
+    FPS = "fps"
+    # 每N帧取一帧
+    EVERY_N = "every_n"
+    # 只取关键帧
+    KEYFRAME = "keyframe"
+
+
+class SamplingPolicy(object):
+    """ 单个任务的推理采样策略
+
+    由媒体回调线程调用accept判断当前帧是否需要送推理，基于GstBuffer的pts单调时间戳,
+    pts无效时退化为本机单调时钟
+    algoParam配置:
+        sampleFps: 目标帧率(float)
+        sampleEveryN: 每N帧取一帧(int)
+        sampleKeyframeOnly: 只取关键帧(bool)
+        replay: 离线回放(bool)
+    Attributes:
+        mode: SamplingMode
+        fps: 目标帧率
+        every_n: 帧间隔
+        replay: 回放模式，每N帧按pts换算的帧序号选取，同一个文件每次选中的帧相同，并且不按墙上时钟限流
+    """
+
+    def __init__(self, mode=SamplingMode.ALL, fps=0.0, every_n=1, replay=False):
+        self.mode = mode
+        self.fps = fps
+        self.every_n = max(1, every_n)
+        self.replay = replay
+        self._period_ns = int(NS_PER_SECOND / fps) if fps > 0 else 0
+        self._next_pts = None
+        self._frame_count = 0
+        self._frame_ns = 0
+
+    @staticmethod
+    def from_algo_param(algo_param, default_interval=0.0):
+        """ 从algoParam解析采样策略, 没有配置时按default_interval(秒)采样 """
+        param = algo_param_to_dict(algo_param)
+        replay = bool(param.get("replay"))
+        try:
+            if param.get("sampleKeyframeOnly"):
+                return SamplingPolicy(SamplingMode.KEYFRAME, replay=replay)
+            if param.get("sampleEveryN") is not None:
+                return SamplingPolicy(SamplingMode.EVERY_N, every_n=int(param["sampleEveryN"]), replay=replay)
+            if param.get("sampleFps") is not None:
+                fps = float(param["sampleFps"])
+                if fps > 0:
+                    return SamplingPolicy(SamplingMode.FPS, fps=fps, replay=replay)
+                return SamplingPolicy(SamplingMode.ALL, replay=replay)
+        except (TypeError, ValueError) as e:
+            log.error("sampling param error param={} e={}".format(param, e))
+        if replay:
+            return SamplingPolicy(SamplingMode.EVERY_N, every_n=REPLAY_EVERY_N, replay=True)
+        if default_interval > 0:
+            return SamplingPolicy(SamplingMode.FPS, fps=1.0 / default_interval)
+        return SamplingPolicy(SamplingMode.ALL)
+
+    def interval(self):
+        """ 按帧率采样时两次推理的最小间隔(秒)，其它模式和回放为0 """
+        if self.mode == SamplingMode.FPS and self.fps > 0 and not self.replay:
+            return 1.0 / self.fps
+        return 0.0
+
+    def reset(self):
+        self._next_pts = None
+        self._frame_count = 0
+        self._frame_ns = 0
+
+    def accept(self, pts, keyframe=True, duration=None):
+        """ 判断该帧是否送推理，pts、duration单位纳秒 """
+        if self.mode == SamplingMode.KEYFRAME:
+            return keyframe
+        if self.mode == SamplingMode.EVERY_N and self.replay and pts is not None and pts != CLOCK_TIME_NONE:
+            # 帧时长取第一帧的，按pts换算帧序号，和从哪一帧开始解码无关
+            if self._frame_ns <= 0 and duration is not None and 0 < duration != CLOCK_TIME_NONE:
+                self._frame_ns = duration
+            if self._frame_ns > 0:
+                return (pts + self._frame_ns // 2) // self._frame_ns % self.every_n == 0
+        if self.mode == SamplingMode.EVERY_N:
+            accepted = self._frame_count % self.every_n == 0
+            self._frame_count += 1
+            return accepted
+        if self.mode == SamplingMode.FPS:
+            if pts is None or pts == CLOCK_TIME_NONE:
+                pts = int(time.monotonic() * NS_PER_SECOND)
+            # 首帧或者时间戳回退(重连、循环播放)时重新计时
+            if self._next_pts is None or pts < self._next_pts - self._period_ns:
+                self._next_pts = pts
+            if pts < self._next_pts:
+                return False
+            # 以理想时间点递进，避免帧间隔抖动累积误差
+            self._next_pts += self._period_ns
+            if self._next_pts <= pts:
+                self._next_pts = pts + self._period_ns
+            return True
+        return True
+
+    def to_dict(self):
+        return {"mode": self.mode, "fps": self.fps, "every_n": self.every_n, "replay": self.replay}
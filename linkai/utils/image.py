@@ -23,14 +23,9 @@ import numpy
 import logging
 import time
 
-# from turbojpeg import TurboJPEG, TJPF_GRAY, TJSAMP_GRAY, TJPF_RGB
-
 log = logging.getLogger(__name__)
 
 
-# jpeg = TurboJPEG()
-
-
 # 类定义
 class ImageInfo:
     array = []
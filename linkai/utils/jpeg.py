@@ -0,0 +1,149 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2014-2018 Alibaba Group. All rights reserved.
+# License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+import logging
+import numpy
+import abc
+import cv2
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGBA, TJPF_BGRA, TJPF_RGB, TJPF_BGR, \
+        TJSAMP_444, TJSAMP_422, TJSAMP_420, TJSAMP_GRAY
+except ImportError:
+    TurboJPEG = None
+
+log = logging.getLogger(__name__)
+
+# 每像素字节数
+CHANNELS = {"RGBA": 4, "BGRA": 4, "RGB": 3, "BGR": 3}
+
+
+class JpegEncoder(metaclass=abc.ABCMeta):
+    """ jpeg编码器基类，子类实现_encode
+
+    Attributes:
+        quality: 编码质量 1~100
+        subsample: 色度抽样 "444" "422" "420" "gray"
+        max_width: 编码前按宽度等比缩小，0表示不缩放
+    """
+    name = "base"
+
+    def __init__(self, quality=85, subsample="420", max_width=0):
+        self.quality = quality
+        self.subsample = subsample
+        self.max_width = max_width
+
+    @staticmethod
+    def to_image(input_buffer, format_type, width, height):
+        """ bytes或ndarray统一成(h, w, c)的ndarray视图，不做拷贝 """
+        channels = CHANNELS[format_type]
+        if isinstance(input_buffer, numpy.ndarray):
+            return input_buffer.reshape(height, width, channels)
+        return numpy.frombuffer(input_buffer, numpy.uint8).reshape(height, width, channels)
+
+    def scale(self, image):
+        height, width = image.shape[:2]
+        if self.max_width <= 0 or width <= self.max_width:
+            return image
+        new_height = max(1, int(height * self.max_width / width))
+        return cv2.resize(image, (self.max_width, new_height), interpolation=cv2.INTER_AREA)
+
+    def encode(self, input_buffer, format_type, width, height):
+        """ 编码成jpeg，返回bytes，不支持的格式返回None """
+        if format_type == "NV12":
+            # 解码端输出NV12时先转成BGR
+            if not isinstance(input_buffer, numpy.ndarray):
+                input_buffer = numpy.frombuffer(input_buffer, numpy.uint8)
+            input_buffer = cv2.cvtColor(input_buffer.reshape(height * 3 // 2, width), cv2.COLOR_YUV2BGR_NV12)
+            format_type = "BGR"
+        if format_type not in CHANNELS:
+            log.error("jpeg encode err unsupport image_type={}".format(format_type))
+            return None
+        image = self.scale(self.to_image(input_buffer, format_type, width, height))
+        return self._encode(image, format_type)
+
+    @abc.abstractmethod
+    def _encode(self, image, format_type):
+        """ 编码(h, w, c)的图像，返回jpeg bytes，失败返回None """
+
+
+class OpenCVJpegEncoder(JpegEncoder):
+    """ opencv编码，RGB类输入需要一次颜色转换 """
+    name = "opencv"
+
+    _convert = {
+        "RGBA": cv2.COLOR_RGBA2BGR,
+        "BGRA": cv2.COLOR_BGRA2BGR,
+        "RGB": cv2.COLOR_RGB2BGR,
+    }
+    # opencv没有灰度抽样参数，"gray"时先转成单通道灰度图再编码
+    _convert_gray = {
+        "RGBA": cv2.COLOR_RGBA2GRAY,
+        "BGRA": cv2.COLOR_BGRA2GRAY,
+        "RGB": cv2.COLOR_RGB2GRAY,
+        "BGR": cv2.COLOR_BGR2GRAY,
+    }
+
+    def __init__(self, quality=85, subsample="420", max_width=0):
+        JpegEncoder.__init__(self, quality, subsample, max_width)
+        self.params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        self.convert = self._convert_gray if subsample == "gray" else self._convert
+        # 新版本opencv才支持设置色度抽样
+        if hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR"):
+            factors = {"444": "IMWRITE_JPEG_SAMPLING_FACTOR_444", "422": "IMWRITE_JPEG_SAMPLING_FACTOR_422",
+                       "420": "IMWRITE_JPEG_SAMPLING_FACTOR_420"}
+            if subsample in factors:
+                self.params += [int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR), int(getattr(cv2, factors[subsample]))]
+
+    def _encode(self, image, format_type):
+        if format_type in self.convert:
+            image = cv2.cvtColor(image, self.convert[format_type])
+        ok, img_encode = cv2.imencode('.jpg', image, self.params)
+        if not ok:
+            return None
+        return img_encode.tobytes()
+
+
+class TurboJpegEncoder(JpegEncoder):
+    """ libjpeg-turbo编码，直接接收RGBA等格式，不需要颜色转换拷贝 """
+    name = "turbojpeg"
+
+    def __init__(self, quality=85, subsample="420", max_width=0):
+        JpegEncoder.__init__(self, quality, subsample, max_width)
+        self.jpeg = TurboJPEG()
+        self.pixel_formats = {"RGBA": TJPF_RGBA, "BGRA": TJPF_BGRA, "RGB": TJPF_RGB, "BGR": TJPF_BGR}
+        self.jpeg_subsample = {"444": TJSAMP_444, "422": TJSAMP_422, "420": TJSAMP_420,
+                               "gray": TJSAMP_GRAY}.get(subsample, TJSAMP_420)
+
+    def _encode(self, image, format_type):
+        return self.jpeg.encode(numpy.ascontiguousarray(image), quality=self.quality,
+                                pixel_format=self.pixel_formats[format_type], jpeg_subsample=self.jpeg_subsample)
+
+
+def create_jpeg_encoder(backend="auto", quality=85, subsample="420", max_width=0):
+    """ 创建jpeg编码器，auto优先使用turbojpeg，不可用时退回opencv """
+    if backend in ("auto", TurboJpegEncoder.name) and TurboJPEG is not None:
+        try:
+            return TurboJpegEncoder(quality, subsample, max_width)
+        except Exception as e:
+            # 找不到libturbojpeg动态库
+            log.warning("turbojpeg not available, fallback to opencv, error={}".format(e))
+    elif backend == TurboJpegEncoder.name:
+        log.warning("turbojpeg not installed, fallback to opencv")
+    return OpenCVJpegEncoder(quality, subsample, max_width)
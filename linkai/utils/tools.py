@@ -22,12 +22,16 @@ import urllib
 import json
 import time
 from urllib.error import URLError
-import cv2
-import numpy
 import logging
+from linkai import conf
+from .jpeg import create_jpeg_encoder
 
 log = logging.getLogger(__name__)
 
+jpeg_encoder = create_jpeg_encoder(conf.get_string("Jpeg", "backend"), conf.get_int("Jpeg", "quality"),
+                                   conf.get_string("Jpeg", "subsample"), conf.get_int("Jpeg", "max_width"))
+log.info("jpeg encoder backend={}".format(jpeg_encoder.name))
+
 
 def json_post(url, req_value):
     timeout = 2
@@ -73,6 +77,8 @@ def compress_buf_to_jpg(image_type, pic_width, pic_height, input_buffer, file_na
     if file_name is None:
         return False
     str_encode = compress_buf_to_jpg_data(image_type, pic_width, pic_height, input_buffer)
+    if str_encode is None:
+        return False
     with open(file_name, 'wb+') as f:
         f.write(str_encode)
         f.close()
@@ -81,14 +87,4 @@ def compress_buf_to_jpg(image_type, pic_width, pic_height, input_buffer, file_na
 
 # buf转jpg_data
 def compress_buf_to_jpg_data(image_type, pic_width, pic_height, input_buffer):
-    if image_type != "RGBA" and image_type != "BGRA":
-        log.error("compress_buf_to_jpg err unsupport image_type={}".format(image_type))
-        return None
-    np_arr = numpy.fromstring(input_buffer, numpy.uint8)
-    color_image = np_arr.reshape(pic_height, pic_width, 4)
-    if image_type == "RGBA":
-        color_image = cv2.cvtColor(color_image, cv2.COLOR_RGBA2BGRA)
-    img_encode = cv2.imencode('.jpg', color_image)[1]
-    data_encode = numpy.array(img_encode)
-    str_encode = data_encode.tostring()
-    return str_encode
+    return jpeg_encoder.encode(input_buffer, image_type, pic_width, pic_height)